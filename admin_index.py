@@ -0,0 +1,236 @@
+"""
+Sorted, filterable views of students and parents for the admin list APIs
+
+AdminIndex flattens the user store into student and parent rows and keeps
+them sorted by every supported sort key, plus per-level and per-parent
+subsets. The index is rebuilt only when the user store's revision changes;
+each request then bisects to its cursor and reads one page.
+
+Cursors are keyset cursors (the last row's sort key and id), so pages stay
+stable while rows are added or removed between requests.
+"""
+
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class QueryError(ValueError):
+    """A list query had an unknown field, sort key or a malformed cursor"""
+
+
+def _level(student):
+    return student.get('progress', {}).get('current_level') or student.get('level', '')
+
+
+STUDENT_SORTS = {
+    'name': lambda row: row['name'].lower(),
+    'age': lambda row: int(row['age']) if str(row.get('age', '')).isdigit() else -1,
+    'level': lambda row: LEVELS.index(row['current_level']) if row['current_level'] in LEVELS else -1,
+    'parent_name': lambda row: row['parent_name'].lower(),
+    'last_updated': lambda row: row.get('progress', {}).get('last_updated', ''),
+}
+STUDENT_FIELDS = ('id', 'name', 'age', 'grade', 'level', 'current_level', 'enrolled_date', 'progress',
+                  'parent_id', 'parent_name', 'parent_email', 'parent_version')
+
+PARENT_SORTS = {
+    'name': lambda row: row['name'].lower(),
+    'email': lambda row: row['email'].lower(),
+    'created_at': lambda row: row.get('created_at', ''),
+    'student_count': lambda row: row['student_count'],
+}
+PARENT_FIELDS = ('id', 'name', 'email', 'created_at', 'student_count', 'levels', 'version', 'students')
+# Embedded student lists are only sent when asked for with ?fields=
+PARENT_DEFAULT_FIELDS = ('id', 'name', 'email', 'created_at', 'student_count', 'levels', 'version')
+
+
+def encode_cursor(key, row_id):
+    return base64.urlsafe_b64encode(json.dumps([key, row_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        key, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise QueryError('Invalid cursor')
+    return key, row_id
+
+
+def parse_fields(value, allowed, default):
+    """Turn ?fields=a,b into a tuple, checking every name"""
+    if not value:
+        return default
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise QueryError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_LIMIT
+    except ValueError:
+        raise QueryError('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def student_rows(user):
+    """One parent's students as student list rows"""
+    return [dict(student, parent_id=user['id'], parent_name=user['parent_name'], parent_email=user['email'],
+                 parent_version=user.get('version', 0), current_level=_level(student))
+            for student in user.get('students', [])]
+
+
+def parent_row(user, students):
+    """A parent as a parent list row; students are its student_rows"""
+    return {
+        'id': user['id'],
+        'name': user['parent_name'],
+        'email': user['email'],
+        'created_at': user.get('created_at', ''),
+        'student_count': len(students),
+        'levels': sorted({row['current_level'] for row in students}),
+        'version': user.get('version', 0),
+        'students': user.get('students', []),
+    }
+
+
+class SortedView:
+    """Rows sorted by (key, id), with keyset paging"""
+
+    def __init__(self, rows, key_fn):
+        entries = sorted(((key_fn(row), row['id'], row) for row in rows), key=lambda e: (e[0], e[1]))
+        self.keys = [(key, row_id) for key, row_id, _ in entries]
+        self.rows = [row for _, _, row in entries]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def prefix_range(self, prefix):
+        """Index range of rows whose (string) key starts with prefix"""
+        return bisect_left(self.keys, (prefix, '')), bisect_left(self.keys, (prefix + '\uffff', ''))
+
+    def page(self, cursor, limit, descending=False, predicate=None, bounds=None):
+        """Return (rows, next_cursor) for one page"""
+        lo, hi = bounds or (0, len(self.rows))
+        if descending:
+            start = (bisect_left(self.keys, tuple(cursor), lo, hi) if cursor else hi) - 1
+            indexes = range(start, lo - 1, -1)
+        else:
+            start = bisect_right(self.keys, tuple(cursor), lo, hi) if cursor else lo
+            indexes = range(start, hi)
+
+        page, last = [], None
+        for i in indexes:
+            if predicate is None or predicate(self.rows[i]):
+                if len(page) == limit:
+                    return page, encode_cursor(*last)
+                page.append(self.rows[i])
+                last = self.keys[i]
+        return page, None
+
+    def count(self, predicate=None, bounds=None):
+        lo, hi = bounds or (0, len(self.rows))
+        if predicate is None:
+            return hi - lo
+        return sum(1 for i in range(lo, hi) if predicate(self.rows[i]))
+
+
+class AdminIndex:
+    """Lazily rebuilt student and parent indexes over a UserStore"""
+
+    def __init__(self, user_store):
+        self.user_store = user_store
+        self._lock = threading.Lock()
+        self._revision = None
+        self._students = []
+        self._parents = []
+        self._by_parent = {}
+        self._levels = set()
+        self._views = {}
+
+    def _rebuild(self, revision):
+        students, parents, by_parent = [], [], {}
+        for user in self.user_store.all():
+            if user.get('role') == 'admin':
+                continue
+            rows = student_rows(user)
+            students.extend(rows)
+            if rows:
+                by_parent[user['id']] = rows
+            parents.append(parent_row(user, rows))
+        self._students, self._parents, self._by_parent, self._views = students, parents, by_parent, {}
+        self._levels = {row['current_level'] for row in students}
+        self._revision = revision
+
+    def _view(self, kind, sort, level=None, parent_id=None):
+        """Sorted view for a kind/sort/filter combination, built on first use"""
+        revision = self.user_store.revision()
+        with self._lock:
+            if revision != self._revision:
+                self._rebuild(revision)
+            sorts = STUDENT_SORTS if kind == 'students' else PARENT_SORTS
+            if parent_id:
+                # One family's students: small enough to sort per request
+                rows = self._by_parent.get(parent_id, [])
+                if level:
+                    rows = [r for r in rows if r['current_level'] == level]
+                return SortedView(rows, sorts[sort])
+
+            if level and level not in self._levels:
+                return SortedView([], sorts[sort])
+
+            key = (kind, sort, level)
+            view = self._views.get(key)
+            if view is None:
+                rows = self._students if kind == 'students' else self._parents
+                if level:
+                    rows = [r for r in rows if (r['current_level'] == level if kind == 'students'
+                                                 else level in r['levels'])]
+                view = self._views[key] = SortedView(rows, sorts[sort])
+            return view
+
+    def warm(self):
+        """Build the index and the default student and parent views ahead of the first request"""
+        self.query('students', {})
+        self.query('parents', {})
+
+    def query(self, kind, args):
+        """Run a list query from request args; returns (rows, next_cursor, total)"""
+        if kind == 'students':
+            sorts, allowed, default = STUDENT_SORTS, STUDENT_FIELDS, STUDENT_FIELDS
+        else:
+            sorts, allowed, default = PARENT_SORTS, PARENT_FIELDS, PARENT_DEFAULT_FIELDS
+
+        sort = args.get('sort', 'name')
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in sorts:
+            raise QueryError(f"Unknown sort key: {sort}")
+        fields = parse_fields(args.get('fields'), allowed, default)
+        limit = parse_limit(args.get('limit'))
+        cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+
+        view = self._view(kind, sort, args.get('level') or None,
+                          args.get('parent_id') if kind == 'students' else None)
+
+        # Name prefixes are a bisected range when sorting by name, a filter otherwise
+        prefix = (args.get('name') or '').lower()
+        bounds = predicate = None
+        if prefix and sort == 'name':
+            bounds = view.prefix_range(prefix)
+        elif prefix:
+            predicate = lambda row: row['name'].lower().startswith(prefix)
+
+        try:
+            rows, next_cursor = view.page(cursor, limit, descending, predicate, bounds)
+        except TypeError:
+            raise QueryError('Cursor does not match the sort key')
+        rows = [{field: row.get(field) for field in fields} for row in rows]
+        return rows, next_cursor, view.count(predicate, bounds)
@@ -0,0 +1,88 @@
+"""
+Incrementally maintained totals for the admin dashboard header
+
+AdminSummary subscribes to the user store and keeps each parent's
+contribution (students, projects, hours, students per level) so a save or
+delete only subtracts the old contribution and adds the new one. Only a full
+reload from storage (e.g. another worker wrote the file) recounts everything.
+
+Registrations are counted from storage and the count is kept against the
+storage's registrations signature, so signups taken by other workers or
+processes (and by this one before a restart) are picked up.
+"""
+
+import threading
+from collections import Counter
+
+from dashboard import as_number
+
+
+def _contribution(user):
+    """What one user adds to the totals"""
+    if user.get('role') == 'admin':
+        return Counter()
+    students = user.get('students', [])
+    totals = Counter(parents=1, students=len(students))
+    for student in students:
+        progress = student.get('progress', {})
+        totals['projects'] += int(as_number(progress.get('completed_projects')))
+        totals['hours'] += as_number(progress.get('total_hours'))
+        totals['level:' + (progress.get('current_level') or student.get('level', ''))] += 1
+    return totals
+
+
+class AdminSummary:
+    """Constant-time admin totals kept up to date from user store events"""
+
+    def __init__(self, user_store, storage):
+        self.user_store = user_store
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._contributions = {}
+        self._totals = Counter()
+        self._registrations = None
+        self._registrations_signature = None
+        user_store.subscribe(self._on_change)
+
+    def _on_change(self, event, payload):
+        with self._lock:
+            if event == 'reload':
+                self._contributions = {user['id']: _contribution(user) for user in payload}
+                self._totals = Counter()
+                for contribution in self._contributions.values():
+                    self._totals.update(contribution)
+                return
+
+            user_id = payload['id'] if event == 'save' else payload
+            self._totals.subtract(self._contributions.pop(user_id, Counter()))
+            if event == 'save':
+                contribution = self._contributions[user_id] = _contribution(payload)
+                self._totals.update(contribution)
+
+    def registration_added(self):
+        """Recount on the next snapshot; with the JSON backend the signup shows
+        once the log's background writer has flushed it"""
+        with self._lock:
+            self._registrations_signature = None
+
+    def snapshot(self):
+        """Return the current totals"""
+        # Picks up changes made by other processes (and the first load)
+        self.user_store.revision()
+        signature = self.storage.registrations_signature()
+        if self._registrations is None or signature != self._registrations_signature:
+            count = self.storage.count_registrations()
+            with self._lock:
+                self._registrations, self._registrations_signature = count, signature
+
+        with self._lock:
+            totals = self._totals
+            return {
+                'total_students': totals['students'],
+                'total_parents': totals['parents'],
+                'total_projects': totals['projects'],
+                'total_hours': round(totals['hours'], 1),
+                'students_by_level': {key[len('level:'):]: count for key, count in totals.items()
+                                      if key.startswith('level:') and count > 0},
+                'registrations': self._registrations,
+            }
@@ -1,10 +1,36 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import (Flask, render_template, request, jsonify, session, redirect, url_for, before_render_template,
+                   template_rendered, g, Response, abort)
 from dotenv import load_dotenv
 import os
-import json
-from datetime import datetime, timedelta
-import hashlib
-import secrets
+import gc
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from functools import wraps
+
+import click
+
+from assets import AssetManifest, build_assets
+from css_pipeline import CACHE_DIR as CSS_CACHE_DIR, CSSBundle, build_css, fetch_css
+from admin_index import AdminIndex, QueryError, parse_limit
+from admin_summary import AdminSummary
+from changes import ChangeFeed
+from conditional import JSONResponseCache
+from dashboard import DashboardCache
+from health import ReadinessProbe
+from datagen import generate_registrations, generate_users, write_json_stream
+from page_cache import PageCache
+from sessions import get_session_interface
+from static_files import compress_static, serve_static
+from log_config import configure_logging
+from metrics import (PASSWORD_SECONDS, REGISTRY, RENDER_SECONDS, REQUEST_SECONDS, REQUESTS, STORAGE_SECONDS,
+                     instrument, render as render_metrics)
+from passwords import PasswordHasher, PasswordVerifier, VerifierBusy, benchmark, percentile, tune
+from registration_log import write_json_array
+from search import SearchIndex
+from storage import ConflictError, JSONStorage, SQLiteStorage, get_storage, migrate_json_to_sqlite
+from user_store import RoleCache, UserStore, copy_user
 
 load_dotenv()
 
@@ -16,34 +42,224 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'cookie')  # 'cookie', 'memory' or 'sqlite'
+app.config['SESSION_DB'] = os.environ.get('SESSION_DB', 'sessions.db')
+app.config['SESSION_MAX_ENTRIES'] = int(os.environ.get('SESSION_MAX_ENTRIES', 10000))
+app.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 86400))  # seconds, for non-"remember me" sessions
+app.config['SESSION_REFRESH'] = int(os.environ.get('SESSION_REFRESH', 300))  # seconds between expiry extensions
+app.config['CACHED_PAGES'] = ['home.html', 'tech_stack.html', 'curriculum.html', 'about.html',
+                              'teaching_approach.html', 'unplugged_activities.html', 'projects.html']
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'json')  # 'json' or 'sqlite'
+app.config['SQLITE_PATH'] = os.environ.get('SQLITE_PATH', 'cyberstudy.db')
+app.config['REGISTRATION_LOG'] = os.environ.get('REGISTRATION_LOG', 'registrations.jsonl')
+app.config['REGISTRATION_BATCH_SIZE'] = int(os.environ.get('REGISTRATION_BATCH_SIZE', 100))
+app.config['REGISTRATION_FLUSH_MS'] = int(os.environ.get('REGISTRATION_FLUSH_MS', 50))
+app.config['PASSWORD_KDF'] = os.environ.get('PASSWORD_KDF', 'pbkdf2_sha256')  # 'pbkdf2_sha256' or 'scrypt'
+app.config['PBKDF2_ITERATIONS'] = int(os.environ.get('PBKDF2_ITERATIONS', 300000))
+app.config['SCRYPT_N'] = int(os.environ.get('SCRYPT_N', 2 ** 14))
+app.config['PASSWORD_WORKERS'] = int(os.environ.get('PASSWORD_WORKERS', 2))
+app.config['PASSWORD_QUEUE_DEPTH'] = int(os.environ.get('PASSWORD_QUEUE_DEPTH', 16))
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_LEVELS'] = os.environ.get('LOG_LEVELS', 'werkzeug=WARNING')  # e.g. "storage=DEBUG,app=WARNING"
+app.config['LOG_SAMPLE'] = os.environ.get('LOG_SAMPLE', 'static=0.01')  # fraction of INFO request logs kept per route
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # if set, /metrics requires "Authorization: Bearer <token>"
+app.config['READYZ_TTL'] = float(os.environ.get('READYZ_TTL', 5))  # seconds a /readyz result is reused
+app.config['CHANGE_LOG_SIZE'] = int(os.environ.get('CHANGE_LOG_SIZE', 1000))  # admin change events kept for delta sync
+app.config['CHANGE_STREAM_SECONDS'] = int(os.environ.get('CHANGE_STREAM_SECONDS', 55))  # before the browser reconnects
+app.config['CHANGE_STREAM_MAX'] = int(os.environ.get('CHANGE_STREAM_MAX', 4))  # open streams per worker, each holds a thread
+app.config['API_CACHE_ENTRIES'] = int(os.environ.get('API_CACHE_ENTRIES', 256))  # encoded JSON API bodies kept
+app.config['SEARCH_DOCS_DIR'] = os.environ.get('SEARCH_DOCS_DIR', os.path.join(app.root_path, 'CyberStudy', 'docs'))
+
+# JSON logs, written by a background thread
+configure_logging(app.config)
+logger = logging.getLogger(__name__)
+
+# Users are kept in memory and indexed; storage is only re-read when it changes
+storage = instrument(get_storage(app.config), STORAGE_SECONDS,
+                     ('signature', 'load_users', 'save_many', 'delete_user',
+                      'load_registrations', 'count_registrations', 'add_registration'))
+user_store = UserStore(storage)
+dashboard_cache = DashboardCache(user_store)
+admin_index = AdminIndex(user_store)
+admin_summary = AdminSummary(user_store, storage)
+role_cache = RoleCache(user_store)
+change_feed = ChangeFeed(user_store, capacity=app.config['CHANGE_LOG_SIZE'])
+
+# Signed cookies by default; with SESSION_BACKEND=memory/sqlite sessions live
+# server-side and the cookie only carries the session id
+app.session_interface = get_session_interface(app.config)
+
+# Password hashing runs on a bounded pool so sign-in bursts can't starve page requests
+password_hasher = PasswordHasher(app.config['PASSWORD_KDF'],
+                                 iterations=app.config['PBKDF2_ITERATIONS'],
+                                 scrypt_n=app.config['SCRYPT_N'])
+instrument(password_hasher, PASSWORD_SECONDS, ('hash', 'verify'))
+password_verifier = PasswordVerifier(password_hasher,
+                                     workers=app.config['PASSWORD_WORKERS'],
+                                     queue_depth=app.config['PASSWORD_QUEUE_DEPTH'])
+
+# Fingerprinted static assets produced by `flask build-assets`
+asset_manifest = AssetManifest(app.static_folder)
+
+# Tree-shaken CSS bundle and per-page critical CSS produced by `flask build-css`
+css_bundle = CSSBundle(app.static_folder)
+
+# The marketing pages don't depend on the request, so they are rendered once per build
+page_cache = PageCache(app, extra_files=[asset_manifest.path, css_bundle.path])
+
+# JSON API bodies keyed by the version of the data they were built from
+api_responses = JSONResponseCache(lambda payload: app.json.dumps(payload, separators=(',', ':')), page_cache.version,
+                                  max_entries=app.config['API_CACHE_ENTRIES'])
+
+# Full-text index over the teaching content, re-indexed as the docs change
+search_index = SearchIndex(app.config['SEARCH_DOCS_DIR'])
+
+def storage_writable():
+    storage.check_writable()
+    return True
+
+readiness = ReadinessProbe({
+    'user_store': lambda: user_store.loaded,
+    'storage_writable': storage_writable,
+    'page_cache': lambda: page_cache.is_warm(app.config['CACHED_PAGES']),
+    'search_index': lambda: len(search_index) > 0,
+}, ttl=app.config['READYZ_TTL'])
+
+# Probes are answered without logging or metrics, so they don't drown out real traffic
+PROBE_ENDPOINTS = {'healthz', 'readyz'}
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """Point url_for('static', ...) at the fingerprinted build output when there is one"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = asset_manifest.resolve(values['filename'])
+
+def static_file(filename):
+    """Serve static files with precompressed siblings, conditional requests and ranges"""
+    return serve_static(app.static_folder, filename)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    """One structured line per request (sampled per route, see LOG_SAMPLE)"""
+    if logger.isEnabledFor(logging.INFO) and 'request_start' in g and request.endpoint not in PROBE_ENDPOINTS:
+        logger.info("request", extra={
+            'route': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.request_start) * 1000, 2),
+        })
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_start' in g and request.endpoint not in PROBE_ENDPOINTS:
+        # Unmatched URLs share one label so scanners can't blow up the series count
+        endpoint = request.endpoint or 'unmatched'
+        REQUESTS.inc(endpoint, request.method, response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint)
+    return response
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: answers as long as the process is serving requests"""
+    return Response('ok\n', mimetype='text/plain', headers={'Cache-Control': 'no-store'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: 503 until users are loaded, storage is writable and caches are warm"""
+    ready, checks = readiness.status()
+    response = jsonify({'status': 'ready' if ready else 'unavailable', 'checks': checks})
+    response.status_code = 200 if ready else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(render_metrics(REGISTRY), mimetype='text/plain; version=0.0.4')
+
+# Replace Flask's default static view; fingerprinted dist/ files get immutable cache headers
+app.view_functions['static'] = static_file
+
+@app.template_global()
+def picture(filename, alt, sizes='100vw', **attrs):
+    """Responsive <picture> for a static image, falling back to a plain <img>"""
+    return asset_manifest.picture(url_for, filename, alt, sizes, **attrs)
+
+app.jinja_env.globals['asset_manifest'] = asset_manifest
+app.jinja_env.globals['css_bundle'] = css_bundle
+
+@before_render_template.connect_via(app)
+def expose_template_name(sender, template, context, **extra):
+    """Let base.html pick the critical CSS of the page being rendered"""
+    context.setdefault('page_template', template.name)
+
+_render_starts = threading.local()
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    _render_starts.__dict__.setdefault('stack', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+    stack = _render_starts.__dict__.get('stack')
+    if stack:
+        RENDER_SECONDS.observe(time.perf_counter() - stack.pop(), template.name)
 
 @app.route('/')
 def home():
-    return render_template("home.html")
+    return page_cache.response("home.html")
 
 @app.route('/tech_stack')
 def tech_stack():
-    return render_template("tech_stack.html")
+    return page_cache.response("tech_stack.html")
 
 @app.route('/curriculum')
 def curriculum():
-    return render_template("curriculum.html")
+    return page_cache.response("curriculum.html")
 
 @app.route('/about')
 def about():
-    return render_template("about.html")
+    return page_cache.response("about.html")
 
 @app.route('/teaching_approach')
 def teaching_approach():
-    return render_template("teaching_approach.html")
+    return page_cache.response("teaching_approach.html")
 
 @app.route('/unplugged_activities')
 def unplugged_activities():
-    return render_template("unplugged_activities.html")
+    return page_cache.response("unplugged_activities.html")
 
 @app.route('/projects')
 def projects():
-    return render_template("projects.html")
+    return page_cache.response("projects.html")
+
+@app.route('/api/search')
+def api_search():
+    """Search the curriculum and activity content.
+    
+    Query args: q, limit, prefix (0 to match the last word exactly instead of
+    as the start of a word, e.g. once the user picked a completion).
+    """
+    query = request.args.get('q', '')[:200]
+    try:
+        limit = min(parse_limit(request.args.get('limit', '10')), 50)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    results, completions = search_index.search(query, limit, prefix=request.args.get('prefix') != '0')
+    response = jsonify({'query': query, 'results': results, 'completions': completions})
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
 
 @app.route('/signin', methods=['GET', 'POST'])
 def signin():
@@ -53,28 +269,26 @@ def signin():
         password = request.form.get('password', '')
         remember_me = request.form.get('rememberMe') == 'on'
         
-        print(f"Server-side sign-in attempt: {email}")
+        logger.debug("Sign-in attempt", extra={'email': email})
         
         if not email or not password:
             return render_template("signin.html", error="Email and password are required")
         
-        users = load_users()
-        user = None
-        
         # Find user by email
-        for u in users:
-            if u['email'] == email:
-                user = u
-                break
+        user = user_store.get_by_email(email)
         
         if not user:
             return render_template("signin.html", error="Invalid email or password")
         
         # Verify password
-        if not verify_password(password, user['password_hash'], user['salt']):
-            return render_template("signin.html", error="Invalid email or password")
+        try:
+            if not check_password(user, password):
+                return render_template("signin.html", error="Invalid email or password")
+        except VerifierBusy:
+            return render_template("signin.html", error="Too many sign-in attempts right now, please try again"), 503
         
         # Set session
+        role_cache.remember(user)
         session['authenticated'] = True
         session['user_id'] = user['id']
         session['parent_name'] = user['parent_name']
@@ -83,13 +297,13 @@ def signin():
         # Check if user is admin
         if user.get('role') == 'admin':
             session['role'] = 'admin'
-            print(f"Admin signed in: {user['email']}")
+            logger.info("Admin signed in", extra={'user_id': user['id']})
             return redirect(url_for('admin_dashboard'))
         
         if remember_me:
             session.permanent = True
         
-        print(f"Server-side session set: {dict(session)}")
+        logger.info("Signed in", extra={'user_id': user['id'], 'remember_me': remember_me})
         
         # Redirect to parent dashboard
         return redirect(url_for('parent_dashboard'))
@@ -119,14 +333,10 @@ def test_session_page():
 @app.route('/parent-dashboard')
 def parent_dashboard():
     # Check if user is authenticated
-    print(f"Parent dashboard access attempt. Session data: {dict(session)}")
-    print(f"Authenticated status: {session.get('authenticated')}")
-    
     if not session.get('authenticated'):
-        print("User not authenticated, redirecting to sign-in")
+        logger.debug("Unauthenticated dashboard access, redirecting to sign-in", extra={'route': 'parent_dashboard'})
         return redirect(url_for('signin'))
     
-    print("User authenticated, rendering dashboard")
     return render_template("parent_dashboard.html")
 
 @app.route('/api/signup', methods=['POST'])
@@ -169,22 +379,13 @@ def signup():
             'status': 'pending'
         }
         
-        # In a real application, you would save this to a database
-        # For now, we'll just log it or save to a file
-        print(f"New registration: {json.dumps(registration, indent=2)}")
-        
-        # Save to file (for demo purposes)
-        registrations_file = 'registrations.json'
-        try:
-            with open(registrations_file, 'r') as f:
-                registrations = json.load(f)
-        except FileNotFoundError:
-            registrations = []
-        
-        registrations.append(registration)
+        logger.info("New registration", extra={'registration_id': registration['id']})
         
-        with open(registrations_file, 'w') as f:
-            json.dump(registrations, f, indent=2)
+        # Queue on the configured storage backend; the JSON backend appends to
+        # a group-committed log instead of rewriting registrations.json
+        storage.add_registration(registration)
+        admin_summary.registration_added()
+        change_feed.registration_added(registration)
         
         return jsonify({
             'success': True,
@@ -197,38 +398,34 @@ def signup():
 
 # Helper functions for authentication
 def hash_password(password):
-    """Hash a password using SHA-256 with salt"""
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return password_hash, salt
-
-def verify_password(password, stored_hash, salt):
-    """Verify a password against stored hash and salt"""
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return password_hash == stored_hash
-
-def load_users():
-    """Load users from file"""
-    try:
-        with open('users.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
+    """Hash a password with the configured KDF and a random salt"""
+    return password_hasher.hash(password)
 
-def save_users(users):
-    """Save users to file"""
-    with open('users.json', 'w') as f:
-        json.dump(users, f, indent=2)
+def check_password(user, password):
+    """Verify a user's password on the worker pool, upgrading outdated hashes"""
+    if not password_verifier.verify(password, user['password_hash'], user['salt']):
+        return False
+    
+    # Transparently rehash legacy SHA-256 or weaker-parameter hashes on login
+    if password_hasher.needs_rehash(user['password_hash']):
+        upgraded = copy_user(user)
+        try:
+            upgraded['password_hash'], upgraded['salt'] = password_verifier.hash(password)
+            user_store.save_user(upgraded)
+            logger.info("Upgraded password hash", extra={'user_id': user['id']})
+        except (VerifierBusy, ConflictError):
+            # The pool is full or someone else changed the account meanwhile;
+            # the password was right, so upgrade on the next sign-in instead
+            pass
+    
+    return True
 
 def create_demo_user():
     """Create a demo user for testing"""
-    users = load_users()
-    
     # Check if demo user already exists
-    for user in users:
-        if user['email'] == 'demo@cyberstudy.com':
-            print("Demo user already exists")
-            return
+    if user_store.get_by_email('demo@cyberstudy.com'):
+        logger.debug("Demo user already exists")
+        return
     
     # Create demo user
     password_hash, salt = hash_password('demo123')
@@ -251,19 +448,15 @@ def create_demo_user():
         ]
     }
     
-    users.append(demo_user)
-    save_users(users)
-    print("Demo user created successfully")
+    user_store.save_user(demo_user)
+    logger.info("Demo user created")
 
 def create_admin_user():
     """Create admin user"""
-    users = load_users()
-    
     # Check if admin user already exists
-    for user in users:
-        if user['email'] == 'admin@cyberstudy.com':
-            print("Admin user already exists")
-            return
+    if user_store.get_by_email('admin@cyberstudy.com'):
+        logger.debug("Admin user already exists")
+        return
     
     # Create admin user
     password_hash, salt = hash_password('admin123')
@@ -278,58 +471,56 @@ def create_admin_user():
         'students': []
     }
     
-    users.append(admin_user)
-    save_users(users)
-    print("Admin user created successfully")
+    user_store.save_user(admin_user)
+    logger.info("Admin user created")
 
 def is_admin(user_id):
     """Check if user is admin"""
-    users = load_users()
-    for user in users:
-        if user['id'] == user_id and user.get('role') == 'admin':
-            return True
-    return False
+    return user_id is not None and role_cache.role(user_id) == 'admin'
+
+def admin_required(view):
+    """Only let signed-in admins through: API routes get a 403, pages a redirect to sign-in"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not session.get('authenticated') or not is_admin(session.get('user_id')):
+            if request.path.startswith('/api/'):
+                return jsonify({'error': 'Admin access required'}), 403
+            return redirect(url_for('signin'))
+        return view(*args, **kwargs)
+    return wrapper
 
 # Authentication API endpoints
 @app.route('/api/signin', methods=['POST'])
 def api_signin():
     try:
         data = request.get_json()
-        print(f"Sign-in attempt with data: {data}")
         
         email = data.get('email', '').strip().lower()
         password = data.get('password', '')
         remember_me = data.get('rememberMe', False)
         
         if not email or not password:
-            print("Missing email or password")
             return jsonify({'error': 'Email and password are required'}), 400
         
-        users = load_users()
-        print(f"Loaded {len(users)} users from database")
-        
-        user = None
-        
         # Find user by email
-        for u in users:
-            if u['email'] == email:
-                user = u
-                break
+        user = user_store.get_by_email(email)
         
         if not user:
-            print(f"User not found for email: {email}")
+            logger.info("Sign-in for unknown email", extra={'email': email})
             return jsonify({'error': 'Invalid email or password'}), 401
         
-        print(f"Found user: {user['email']}")
-        
         # Verify password
-        if not verify_password(password, user['password_hash'], user['salt']):
-            print("Password verification failed")
-            return jsonify({'error': 'Invalid email or password'}), 401
+        try:
+            valid = check_password(user, password)
+        except VerifierBusy:
+            return jsonify({'error': 'Too many sign-in attempts right now, please try again'}), 503, {'Retry-After': '1'}
         
-        print("Password verified successfully")
+        if not valid:
+            logger.info("Sign-in with wrong password", extra={'user_id': user['id']})
+            return jsonify({'error': 'Invalid email or password'}), 401
         
         # Set session
+        role_cache.remember(user)
         session['authenticated'] = True
         session['user_id'] = user['id']
         session['parent_name'] = user['parent_name']
@@ -338,7 +529,7 @@ def api_signin():
         # Check if user is admin
         if user.get('role') == 'admin':
             session['role'] = 'admin'
-            print(f"Admin signed in via API: {user['email']}")
+            logger.info("Admin signed in", extra={'user_id': user['id']})
             return jsonify({
                 'success': True,
                 'message': 'Admin sign in successful',
@@ -350,9 +541,7 @@ def api_signin():
         if remember_me:
             session.permanent = True
         
-        print("Session set successfully")
-        print(f"Session data after setting: {dict(session)}")
-        print(f"Session permanent: {session.permanent}")
+        logger.info("Signed in", extra={'user_id': user['id'], 'remember_me': bool(remember_me)})
         
         return jsonify({
             'success': True,
@@ -361,7 +550,7 @@ def api_signin():
         })
         
     except Exception as e:
-        print(f"Sign-in error: {str(e)}")
+        logger.exception("Sign-in error")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/logout', methods=['POST'])
@@ -389,12 +578,7 @@ def api_forgot_password():
             return jsonify({'error': 'Invalid email format'}), 400
         
         # Check if user exists
-        users = load_users()
-        user_exists = False
-        for user in users:
-            if user['email'] == email:
-                user_exists = True
-                break
+        user_exists = user_store.get_by_email(email) is not None
         
         # Always return success for security (don't reveal if email exists)
         # In a real application, you would:
@@ -403,7 +587,7 @@ def api_forgot_password():
         # 3. Send email with reset link
         # 4. Log the request for security monitoring
         
-        print(f"Password reset requested for email: {email}")
+        logger.info("Password reset requested", extra={'email': email})
         
         return jsonify({
             'success': True,
@@ -411,7 +595,7 @@ def api_forgot_password():
         })
         
     except Exception as e:
-        print(f"Forgot password error: {str(e)}")
+        logger.exception("Forgot password error")
         return jsonify({'error': 'An error occurred processing your request'}), 500
 
 @app.route('/reset-password', methods=['GET', 'POST'])
@@ -442,11 +626,12 @@ def reset_password():
         # 1. Validate the reset token
         # 2. Check if token is expired
         # 3. Find the user associated with the token
-        # 4. Update their password
+        # 4. Update their password and sign them out everywhere with
+        #    app.session_interface.revoke_user()
         # 5. Invalidate the token
         
         # For demo purposes, we'll just show a success message
-        print(f"Password reset attempted with token: {token}")
+        logger.info("Password reset attempted")
         
         return render_template("reset_password.html", 
                              success="Password has been reset successfully! You can now sign in with your new password.",
@@ -460,122 +645,29 @@ def reset_password():
 def api_dashboard_data():
     try:
         # Check authentication
-        print(f"Dashboard data request. Session data: {dict(session)}")
-        print(f"Authenticated status: {session.get('authenticated')}")
-        
         if not session.get('authenticated'):
-            print("User not authenticated for dashboard data")
             return jsonify({'error': 'Not authenticated'}), 401
         
         # Load user data
-        users = load_users()
-        user = None
-        for u in users:
-            if u['id'] == session['user_id']:
-                user = u
-                break
+        user = user_store.get_by_id(session['user_id'])
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Generate demo dashboard data
-        dashboard_data = {
-            'parent_name': user['parent_name'],
-            'stats': {
-                'total_projects': 12,
-                'total_hours': 45,
-                'achievements': 8,
-                'days_to_next_class': 3
-            },
-            'progress': {
-                'percentage': 75,
-                'current_level': 'Intermediate',
-                'next_level': 'Advanced'
-            },
-            'recent_projects': [
-                {
-                    'name': 'Space Adventure Game',
-                    'description': 'Created a 2D platformer using Scratch',
-                    'status': 'completed',
-                    'date': '2024-01-20'
-                },
-                {
-                    'name': 'Weather App',
-                    'description': 'Built a weather display app with Python',
-                    'status': 'in_progress',
-                    'date': '2024-01-18'
-                },
-                {
-                    'name': 'Robot Dance',
-                    'description': 'Programmed robot movements with block coding',
-                    'status': 'completed',
-                    'date': '2024-01-15'
-                }
-            ],
-            'upcoming_classes': [
-                {
-                    'title': 'Python Fundamentals',
-                    'instructor': 'Ms. Sarah',
-                    'date': '2024-01-25',
-                    'time': '4:00 PM'
-                },
-                {
-                    'title': 'Game Development Workshop',
-                    'instructor': 'Mr. Mike',
-                    'date': '2024-01-27',
-                    'time': '2:00 PM'
-                }
-            ],
-            'achievements': [
-                {
-                    'title': 'First Game Complete',
-                    'description': 'Successfully created your first video game',
-                    'icon': 'gamepad',
-                    'date': '2024-01-20'
-                },
-                {
-                    'title': 'Code Debugger',
-                    'description': 'Fixed 10 bugs in your programs',
-                    'icon': 'bug',
-                    'date': '2024-01-18'
-                },
-                {
-                    'title': 'Loop Master',
-                    'description': 'Mastered the concept of loops and repetition',
-                    'icon': 'sync',
-                    'date': '2024-01-15'
-                }
-            ],
-            'messages': [
-                {
-                    'from': 'Ms. Sarah (Instructor)',
-                    'subject': 'Great progress on the weather app!',
-                    'preview': 'Alex is doing excellent work on the weather app project...',
-                    'date': '2024-01-22',
-                    'unread': True
-                },
-                {
-                    'from': 'CyberStudy Team',
-                    'subject': 'New coding challenges available',
-                    'preview': 'Check out the new coding challenges in your dashboard...',
-                    'date': '2024-01-20',
-                    'unread': False
-                }
-            ]
-        }
-        
-        return jsonify(dashboard_data)
+        # Aggregated from the students' stored progress, cached per parent;
+        # the stored version changes with every save of the parent's record
+        today = date.today()
+        return api_responses.respond(('dashboard', user['id'], user.get('version', 0), today),
+                                     lambda: dashboard_cache.get(user, today))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Admin routes
 @app.route('/admin')
+@admin_required
 def admin_dashboard():
     """Admin dashboard - requires admin authentication"""
-    if not session.get('authenticated') or not is_admin(session.get('user_id')):
-        return redirect(url_for('signin'))
-    
     return render_template("admin_dashboard.html")
 
 @app.route('/admin/signin', methods=['GET', 'POST'])
@@ -590,141 +682,408 @@ def admin_logout():
     return redirect(url_for('signin'))
 
 # Admin API endpoints
+@app.route('/api/admin/summary')
+@admin_required
+def api_admin_summary():
+    """Dashboard header totals, maintained incrementally"""
+    return jsonify(admin_summary.snapshot())
+
 @app.route('/api/admin/students')
+@admin_required
 def api_admin_students():
-    """Get all students for admin"""
-    if not session.get('authenticated') or not is_admin(session.get('user_id')):
-        return jsonify({'error': 'Admin access required'}), 403
+    """List students for admin, one page at a time.
     
-    users = load_users()
-    all_students = []
+    Query args: limit, cursor, sort (name, age, level, parent_name, last_updated;
+    prefix with - to reverse), level, parent_id, name (prefix) and fields.
+    """
+    def build():
+        students, next_cursor, total = admin_index.query('students', request.args)
+        return {'students': students, 'next_cursor': next_cursor, 'total': total}
     
-    for user in users:
-        if user.get('role') != 'admin':  # Skip admin users
-            for student in user.get('students', []):
-                student_data = student.copy()
-                student_data['parent_name'] = user['parent_name']
-                student_data['parent_email'] = user['email']
-                student_data['parent_id'] = user['id']
-                all_students.append(student_data)
+    try:
+        return api_responses.respond(('students', user_store.signature(), sorted(request.args.items(multi=True))),
+                                     build)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/admin/changes')
+@admin_required
+def api_admin_changes():
+    """Changes to students and parents since ?since=<version>, for delta sync.
     
-    return jsonify({'students': all_students})
+    Without since, only the current version is returned. With a version this
+    worker doesn't know (another worker's, or older than the change log),
+    reset is true and the client reloads the lists instead.
+    """
+    since = request.args.get('since')
+    events, version = change_feed.changes(since)
+    if since is None:
+        return jsonify({'version': version, 'events': [], 'reset': False})
+    return jsonify({'version': version, 'events': events or [], 'reset': events is None})
+
+@app.route('/api/admin/changes/stream')
+@admin_required
+def api_admin_changes_stream():
+    """The same changes as Server-Sent Events, from ?since= or Last-Event-ID"""
+    # Each open stream holds a server thread; past the limit clients poll /api/admin/changes
+    if not change_feed.try_open_stream(app.config['CHANGE_STREAM_MAX']):
+        return jsonify({'error': 'Too many change streams open, poll /api/admin/changes'}), 503, {'Retry-After': '30'}
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    response = Response(change_feed.stream(since, app.config['CHANGE_STREAM_SECONDS']),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(change_feed.close_stream)
+    return response
+
+# Progress fields an admin can set, with the value used when neither the
+# update nor the stored progress has one
+PROGRESS_DEFAULTS = {
+    'current_level': 'Beginner',
+    'completed_projects': 0,
+    'total_hours': 0,
+    'achievements': 0,
+    'next_class_date': None,
+    'notes': '',
+}
+MAX_BATCH_UPDATES = 500
+# Accepted types per progress field; form posts send numbers as strings
+PROGRESS_TYPES = {
+    'current_level': (str,),
+    'completed_projects': (int, float, str),
+    'total_hours': (int, float, str),
+    'achievements': (int, float, str),
+    'next_class_date': (str, type(None)),
+    'notes': (str,),
+}
+
+def progress_error(update):
+    """Why a progress update (a batch item) can't be applied, or None if it can"""
+    if not isinstance(update, dict):
+        return 'Each update must be an object'
+    if not isinstance(update.get('student_id'), str) or not update['student_id']:
+        return 'student_id must be a non-empty string'
+    for field, types in PROGRESS_TYPES.items():
+        if field in update and (isinstance(update[field], bool) or not isinstance(update[field], types)):
+            return f'Invalid value for {field}'
+    return None
+
+def merge_progress(progress, data):
+    """Return a student's progress with the fields given in data applied"""
+    merged = dict(progress)
+    for field, default in PROGRESS_DEFAULTS.items():
+        merged[field] = data.get(field, progress.get(field, default))
+    merged['last_updated'] = datetime.now().isoformat()
+    return merged
 
 @app.route('/api/admin/students/<student_id>/progress', methods=['POST'])
+@admin_required
 def api_update_student_progress(student_id):
     """Update student progress"""
-    if not session.get('authenticated') or not is_admin(session.get('user_id')):
-        return jsonify({'error': 'Admin access required'}), 403
+    data = request.get_json(silent=True)
+    # The same checks as each item of a batch update
+    error = progress_error(dict(data, student_id=student_id)) if isinstance(data, dict) \
+        else 'Request body must be a JSON object'
+    if error:
+        return jsonify({'error': error}), 400
     
     try:
-        data = request.get_json()
+        # Find the student through the student id index
+        parent, student = user_store.find_student(student_id)
         
-        # Load users and find the student
-        users = load_users()
-        student_found = False
-        
-        for user in users:
-            if user.get('role') != 'admin':
-                for student in user.get('students', []):
-                    if student['id'] == student_id:
-                        # Update student progress
-                        if 'progress' not in student:
-                            student['progress'] = {}
-                        
-                        student['progress'].update({
-                            'last_updated': datetime.now().isoformat(),
-                            'current_level': data.get('current_level', student['progress'].get('current_level', 'Beginner')),
-                            'completed_projects': data.get('completed_projects', student['progress'].get('completed_projects', 0)),
-                            'total_hours': data.get('total_hours', student['progress'].get('total_hours', 0)),
-                            'achievements': data.get('achievements', student['progress'].get('achievements', 0)),
-                            'next_class_date': data.get('next_class_date', student['progress'].get('next_class_date')),
-                            'notes': data.get('notes', student['progress'].get('notes', ''))
-                        })
-                        student_found = True
-                        break
-                if student_found:
-                    break
-        
-        if not student_found:
+        if not student or parent.get('role') == 'admin':
             return jsonify({'error': 'Student not found'}), 404
         
-        # Save updated users
-        save_users(users)
+        # Update student progress on a copy of the parent record; a version
+        # sent by the client must still be current
+        parent = copy_user(parent)
+        if 'version' in data:
+            parent['version'] = data['version']
+        student = next(s for s in parent['students'] if s['id'] == student_id)
+        student['progress'] = merge_progress(student.get('progress', {}), data)
+        
+        # Save the updated parent record
+        user_store.save_user(parent)
         
         return jsonify({'success': True, 'message': 'Student progress updated successfully'})
         
+    except ConflictError:
+        return jsonify({'error': 'This record was changed by someone else; reload and try again'}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/students/progress:batch', methods=['POST'])
+@admin_required
+def api_batch_update_student_progress():
+    """Update progress for many students with a single storage write.
+    
+    Body: {"updates": [{"student_id": "...", "completed_projects": 3, ...}, ...]}.
+    Unknown students and malformed items are reported per item; all the others are applied
+    together or, if the write fails, not at all.
+    """
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'updates must be a non-empty list'}), 400
+    if len(updates) > MAX_BATCH_UPDATES:
+        return jsonify({'error': f'At most {MAX_BATCH_UPDATES} updates per request'}), 400
+    
+    # Apply everything to copies of the affected parents, so a failed write
+    # leaves the in-memory users untouched
+    staged = {}
+    results = []
+    for update in updates:
+        error = progress_error(update)
+        if error:
+            student_id = update.get('student_id') if isinstance(update, dict) else None
+            results.append({'student_id': student_id if isinstance(student_id, str) else None,
+                            'success': False, 'error': error})
+            continue
+        student_id = update['student_id']
+        parent, student = user_store.find_student(student_id)
+        if not student or parent.get('role') == 'admin':
+            results.append({'student_id': student_id, 'success': False, 'error': 'Student not found'})
+            continue
+        
+        copy = staged.get(parent['id'])
+        if copy is None:
+            copy = staged[parent['id']] = copy_user(parent)
+        target = next(s for s in copy['students'] if s['id'] == student_id)
+        target['progress'] = merge_progress(target.get('progress', {}), update)
+        results.append({'student_id': student_id, 'success': True})
+    
+    if staged:
+        try:
+            user_store.save_many(list(staged.values()))
+        except ConflictError as e:
+            return jsonify({'error': f'{e}; reload and try again', 'student_ids': [
+                r['student_id'] for r in results if r['success']]}), 409
+        except Exception as e:
+            return jsonify({'error': f'Failed to save progress: {e}'}), 500
+    
+    updated = sum(1 for result in results if result['success'])
+    return jsonify({'success': updated == len(results), 'updated': updated, 'results': results})
+
 @app.route('/api/admin/parents')
+@admin_required
 def api_admin_parents():
-    """Get all parent accounts for admin"""
-    if not session.get('authenticated') or not is_admin(session.get('user_id')):
-        return jsonify({'error': 'Admin access required'}), 403
-    
-    users = load_users()
-    parents = []
+    """List parent accounts for admin, one page at a time.
     
-    for user in users:
-        if user.get('role') != 'admin':  # Skip admin users
-            parent_data = {
-                'id': user['id'],
-                'name': user['parent_name'],
-                'email': user['email'],
-                'created_at': user['created_at'],
-                'student_count': len(user.get('students', [])),
-                'students': user.get('students', [])
-            }
-            parents.append(parent_data)
+    Query args: limit, cursor, sort (name, email, created_at, student_count;
+    prefix with - to reverse), level, name (prefix) and fields. Students are
+    only embedded with fields=...,students.
+    """
+    def build():
+        parents, next_cursor, total = admin_index.query('parents', request.args)
+        return {'parents': parents, 'next_cursor': next_cursor, 'total': total}
     
-    return jsonify({'parents': parents})
+    try:
+        return api_responses.respond(('parents', user_store.signature(), sorted(request.args.items(multi=True))),
+                                     build)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/api/admin/parents/<parent_id>', methods=['PUT', 'DELETE'])
+@admin_required
 def api_manage_parent(parent_id):
     """Update or delete parent account"""
-    if not session.get('authenticated') or not is_admin(session.get('user_id')):
-        return jsonify({'error': 'Admin access required'}), 403
-    
-    users = load_users()
-    parent_found = False
-    
     if request.method == 'DELETE':
         # Delete parent account
-        users = [user for user in users if user['id'] != parent_id]
-        save_users(users)
+        user_store.delete_user(parent_id)
+        dashboard_cache.invalidate(parent_id)
+        app.session_interface.revoke_user(parent_id)
         return jsonify({'success': True, 'message': 'Parent account deleted successfully'})
     
     elif request.method == 'PUT':
         # Update parent account
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         
-        for user in users:
-            if user['id'] == parent_id and user.get('role') != 'admin':
-                user['parent_name'] = data.get('parent_name', user['parent_name'])
-                user['email'] = data.get('email', user['email'])
-                parent_found = True
-                break
-        
-        if not parent_found:
+        user = user_store.get_by_id(parent_id)
+        if not user or user.get('role') == 'admin':
             return jsonify({'error': 'Parent not found'}), 404
         
-        save_users(users)
+        user = copy_user(user)
+        if 'version' in data:
+            user['version'] = data['version']
+        parent_name = data.get('parent_name', user['parent_name'])
+        if not isinstance(parent_name, str) or not parent_name.strip():
+            return jsonify({'error': 'parent_name must be a non-empty string'}), 400
+        user['parent_name'] = parent_name
+        if 'email' in data:
+            if not isinstance(data['email'], str) or not data['email'].strip():
+                return jsonify({'error': 'email must be a non-empty string'}), 400
+            # Stored lowercase like at registration, and one account per email
+            email = data['email'].strip().lower()
+            existing = user_store.get_by_email(email)
+            if existing is not None and existing['id'] != parent_id:
+                return jsonify({'error': 'Email already in use by another account'}), 409
+            user['email'] = email
+        
+        try:
+            user_store.save_user(user)
+        except ConflictError:
+            return jsonify({'error': 'This record was changed by someone else; reload and try again'}), 409
+        except Exception as e:
+            return jsonify({'error': f'Failed to update parent: {e}'}), 500
         return jsonify({'success': True, 'message': 'Parent account updated successfully'})
 
 # SEO Routes
 @app.route('/sitemap.xml')
 def sitemap():
-    return send_from_directory('static', 'sitemap.xml', mimetype='application/xml')
+    return serve_static(app.static_folder, 'sitemap.xml', mimetype='application/xml')
 
 @app.route('/robots.txt')
 def robots():
-    return send_from_directory('static', 'robots.txt', mimetype='text/plain')
+    return serve_static(app.static_folder, 'robots.txt', mimetype='text/plain')
+
+# CLI commands
+@app.cli.command('migrate-storage')
+def migrate_storage():
+    """Copy users.json and registrations.json into the SQLite database"""
+    source = JSONStorage('users.json', 'registrations.json')
+    target = SQLiteStorage(app.config['SQLITE_PATH'])
+    users, registrations = migrate_json_to_sqlite(source, target)
+    print(f"Migrated {users} users and {registrations} registrations to {app.config['SQLITE_PATH']}")
+
+@app.cli.command('export-registrations')
+@click.option('--output', default='registrations.export.json', help='Path of the JSON array to write')
+def export_registrations(output):
+    """Export all registrations as a legacy-format JSON array"""
+    registrations = storage.load_registrations()
+    write_json_array(output, registrations)
+    print(f"Exported {len(registrations)} registrations to {output}")
+
+@app.cli.command('compact-registrations')
+def compact_registrations():
+    """Fold registrations.jsonl into registrations.json and truncate the log"""
+    if not isinstance(storage, JSONStorage):
+        print("Compaction only applies to the JSON storage backend")
+        return
+    total = storage.compact_registrations()
+    print(f"registrations.json now holds {total} registrations")
+
+@app.cli.command('generate-data')
+@click.option('--parents', default=1000, help='Parent accounts to generate')
+@click.option('--registrations', default=1000, help='Signup registrations to generate')
+@click.option('--seed', default=0, help='Random seed; the same seed gives the same files')
+@click.option('--output-dir', default='.', help='Where to write users.json and registrations.json')
+@click.option('--password', default='parent123', help='Password of every generated parent')
+@click.option('--force', is_flag=True, help='Overwrite existing files')
+def generate_data(parents, registrations, seed, output_dir, password, force):
+    """Write large synthetic users.json and registrations.json files for scale testing"""
+    users_path = os.path.join(output_dir, 'users.json')
+    registrations_path = os.path.join(output_dir, 'registrations.json')
+    existing = [path for path in (users_path, registrations_path) if os.path.exists(path)]
+    if existing and not force:
+        raise click.ClickException(f"{', '.join(existing)} already exists; pass --force to overwrite")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    # One hash for everyone: hashing each account would take hours at scale
+    credentials = password_hasher.hash(password)
+    written = write_json_stream(users_path, generate_users(parents, credentials, seed))
+    print(f"Wrote {written} parents to {users_path} ({os.path.getsize(users_path) / 2 ** 20:.1f} MB)")
+    written = write_json_stream(registrations_path, generate_registrations(registrations, seed))
+    print(f"Wrote {written} registrations to {registrations_path} "
+          f"({os.path.getsize(registrations_path) / 2 ** 20:.1f} MB)")
+    print(f"Parents sign in as parent<N>@example.com with password {password!r}; "
+          "the demo and admin accounts are added on the next start")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Recompress images, build responsive variants and favicons, fingerprint static files"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise click.ClickException("build-assets needs Pillow: pip install Pillow")
+    
+    manifest = build_assets(app.static_folder)
+    asset_manifest.reload()
+    print(f"Built {len(manifest['files'])} files into {os.path.join(app.static_folder, 'dist')}")
+
+@app.cli.command('fetch-css')
+@click.option('--self-host', is_flag=True, help='Also download Font Awesome, Google Fonts and their font files')
+def fetch_css_command(self_host):
+    """Download the third-party CSS build-css uses, so it can run with --offline"""
+    count = fetch_css(self_host=self_host)
+    print(f"Fetched {count} files into {CSS_CACHE_DIR}")
+
+@app.cli.command('build-css')
+@click.option('--self-host', is_flag=True, help='Also bundle Font Awesome and Google Fonts and serve them locally')
+@click.option('--offline', is_flag=True, help='Only use files already downloaded by fetch-css')
+def build_css_command(self_host, offline):
+    """Build the tree-shaken CSS bundle and per-page critical CSS"""
+    def render_page(template):
+        with app.test_request_context('/'):
+            return render_template(template)
+    
+    try:
+        manifest = build_css(app.static_folder, os.path.join(app.root_path, app.template_folder),
+                             render_page, self_host=self_host, static_url=app.static_url_path, offline=offline)
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+    css_bundle.reload()
+    print(f"Built {manifest['bundle']} with critical CSS for {len(manifest['critical'])} pages")
+
+@app.cli.command('compress-static')
+def compress_static_command():
+    """Write .gz/.br siblings for compressible static files"""
+    written = compress_static(app.static_folder)
+    print(f"Wrote {written} precompressed files")
 
-# Initialize demo user and admin on startup
-create_demo_user()
-create_admin_user()
+@app.cli.command('tune-password-hashing')
+@click.option('--target-ms', default=250.0, help='p99 verification latency to stay under')
+@click.option('--samples', default=20, help='Verifications to time per candidate')
+def tune_password_hashing(target_ms, samples):
+    """Benchmark the KDF and suggest the strongest work factor meeting the latency target"""
+    current = percentile(benchmark(password_hasher, samples), 99)
+    print(f"Current {password_hasher.algorithm} settings: p99 {current:.1f} ms")
+    
+    hasher, p99 = tune(app.config['PASSWORD_KDF'], target_ms, samples)
+    print(f"Recommended for p99 < {target_ms:.0f} ms (measured p99 {p99:.1f} ms):")
+    if hasher.algorithm == 'scrypt':
+        print(f"  PASSWORD_KDF=scrypt SCRYPT_N={hasher.scrypt_n}")
+    else:
+        print(f"  PASSWORD_KDF=pbkdf2_sha256 PBKDF2_ITERATIONS={hasher.iterations}")
+
+@app.cli.command('seed-users')
+def seed_users_command():
+    """Create the demo and admin accounts if they don't exist yet (safe to re-run)"""
+    seed_users()
+    print("Demo and admin accounts are in place")
+
+def seed_users():
+    """Create the demo and admin accounts if they are missing"""
+    create_demo_user()
+    create_admin_user()
+
+def create_app():
+    """Load the data and warm every cache once, then return the app.
+
+    Servers call this at startup ("app:create_app()"); with gunicorn --preload
+    it runs in the master, so the workers forked afterwards share the loaded
+    users, indexes, rendered pages and search index copy-on-write. Importing
+    this module writes nothing: accounts are seeded by `flask seed-users`.
+    """
+    # Loading allocates millions of long-lived objects; collecting while that
+    # happens only rescans them (about a third of the startup time at 100k)
+    gc.disable()
+    try:
+        user_store.revision()
+        admin_index.warm()
+        admin_summary.snapshot()
+        page_cache.warm(app.config['CACHED_PAGES'])
+        search_index.refresh(force=True)
+        # Move everything loaded so far out of the collector's reach: a GC pass
+        # in a worker would otherwise write to these objects and unshare their pages
+        gc.collect()
+        gc.freeze()
+    finally:
+        gc.enable()
+    return app
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
-    app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
+    seed_users()
+    create_app().run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
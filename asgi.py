@@ -0,0 +1,204 @@
+"""
+ASGI entry point: serve the Flask app from an event loop
+
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:application
+
+Under gunicorn's threaded worker a request holds one of its --threads from
+the first byte read to the last byte written, so a handful of slow clients
+(a phone uploading a signup form, a large image going out over a bad link)
+can use up the pool while the CPU sits idle. Here the event loop does all the
+socket I/O instead: the request body is received in full before the app sees
+it, the app runs on a thread pool, and its response is queued back to the
+loop, so a thread is only busy while Flask is actually working. The queue
+holds at most RESPONSE_QUEUE_CHUNKS chunks: an app producing a long response
+for a slow client waits for it rather than buffering the whole body. When
+the client disconnects, the app stops at its next chunk and its response is
+closed (which ends an open change stream). The routes in app.py run
+unchanged.
+
+* ASGI_THREADS: app threads per worker process (default 4 per core)
+* ASGI_MAX_BODY: largest request body accepted, in bytes (default 1 MB)
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app
+
+app = create_app()
+
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 4 * _cores()))
+app.config['ASGI_MAX_BODY'] = int(os.environ.get('ASGI_MAX_BODY', 2 ** 20))
+
+# Response chunks queued between an app thread and the event loop
+RESPONSE_QUEUE_CHUNKS = 8
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """The app thread pool of this process (created after gunicorn forks)"""
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(app.config['ASGI_THREADS'], thread_name_prefix='asgi-app')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _environ(scope, body):
+    """Build the WSGI environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The whole body is in hand, chunked or not
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def _run_app(environ, loop, messages, disconnected):
+    """Call the WSGI app on a pool thread, queueing ASGI messages for the event loop"""
+    def put(message):
+        # Blocks while the queue is full, so the app runs at the client's pace
+        asyncio.run_coroutine_threadsafe(messages.put(message), loop).result()
+
+    head = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and head.get('sent'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        head['message'] = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        }
+
+    def send_head():
+        if not head.get('sent'):
+            put(head['message'])
+            head['sent'] = True
+
+    try:
+        result = app(environ, start_response)
+        try:
+            for chunk in result:
+                if disconnected.is_set():
+                    break
+                if chunk:
+                    send_head()
+                    put({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        send_head()
+        put({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    except BaseException as exc:
+        put(exc)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _watch_disconnect(receive, disconnected):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    disconnected.set()
+
+
+async def _reply(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def application(scope, receive, send):
+    """ASGI callable running the Flask app"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return  # no websockets; the server rejects the connection
+
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        if len(body) > app.config['ASGI_MAX_BODY']:
+            await _reply(send, 413, b'Request body too large')
+            return
+        if not message.get('more_body'):
+            break
+
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue(RESPONSE_QUEUE_CHUNKS)
+    disconnected = threading.Event()
+    watcher = loop.create_task(_watch_disconnect(receive, disconnected))
+    loop.run_in_executor(_get_executor(), _run_app, _environ(scope, bytes(body)), loop, messages, disconnected)
+    finished = False
+    try:
+        while not finished:
+            message = await messages.get()
+            if isinstance(message, BaseException):
+                finished = True
+                raise message
+            finished = message['type'] == 'http.response.body' and not message['more_body']
+            if not disconnected.is_set():
+                await send(message)
+    finally:
+        watcher.cancel()
+        if not finished:
+            # Sending failed: stop the app and drain the queue so its thread can finish
+            disconnected.set()
+            while not finished:
+                message = await messages.get()
+                finished = isinstance(message, BaseException) or (
+                    message['type'] == 'http.response.body' and not message['more_body'])
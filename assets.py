@@ -0,0 +1,174 @@
+"""
+Static asset build: image recompression, responsive variants, favicons and
+content-hash fingerprinting
+
+`flask build-assets` writes everything into static/dist/ along with a
+manifest.json that maps each logical static filename (as used in
+url_for('static', filename=...)) to its fingerprinted copy. Because the
+fingerprinted names change whenever the content does, they can be served
+with year-long immutable cache headers.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+
+from markupsafe import Markup, escape
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+RESPONSIVE_WIDTHS = (160, 320, 640, 1024, 1600)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+SKIP_FILES = ('test_session.html', 'test_signin.html', 'style.scss')
+FAVICON_SOURCE = 'images/Logo/LogoNoText.png'
+
+
+def fingerprint(logical_path, data):
+    """Return the fingerprinted name for a file, e.g. css/app.3f2a1b9c0d.css"""
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    root, ext = os.path.splitext(logical_path)
+    return f"{root}.{digest}{ext}"
+
+
+class AssetManifest:
+    """Maps logical static filenames to their fingerprinted build outputs"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+        self.files = {}
+        self.variants = {}
+        self.reload()
+
+    def reload(self):
+        """Re-read manifest.json; an unbuilt tree simply has an empty manifest"""
+        try:
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        self.files = manifest.get('files', {})
+        self.variants = manifest.get('variants', {})
+
+    def has(self, filename):
+        return filename in self.files
+
+    def resolve(self, filename):
+        """Return the fingerprinted filename, or the filename itself if it wasn't built"""
+        return self.files.get(filename, filename)
+
+    def picture(self, url_for, filename, alt, sizes='100vw', **attrs):
+        """Render a <picture> with AVIF/WebP srcsets and an <img> fallback"""
+        attributes = ''.join(f' {key.rstrip("_").replace("_", "-")}="{escape(value)}"'
+                             for key, value in attrs.items())
+        img = f'<img src="{escape(url_for("static", filename=filename))}" alt="{escape(alt)}"{attributes}>'
+
+        variants = self.variants.get(filename)
+        if not variants:
+            return Markup(img)
+
+        sources = []
+        for fmt in ('avif', 'webp'):
+            srcset = ', '.join(f'{url_for("static", filename=v["path"])} {v["width"]}w'
+                               for v in variants if v['format'] == fmt)
+            if srcset:
+                sources.append(f'<source type="image/{fmt}" srcset="{escape(srcset)}" sizes="{escape(sizes)}">')
+        return Markup(f"<picture>{''.join(sources)}{img}</picture>")
+
+
+def _recompress(image, fmt):
+    """Encode an image in a web format and return the bytes"""
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    elif fmt == 'jpeg':
+        image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=80, method=6)
+    elif fmt == 'avif':
+        image.save(buffer, 'AVIF', quality=60)
+    elif fmt == 'ico':
+        image.save(buffer, 'ICO', sizes=[(16, 16), (32, 32), (48, 48)])
+    else:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    return buffer.getvalue()
+
+
+def _square(image):
+    """Pad an image onto a transparent square canvas"""
+    from PIL import Image
+
+    side = max(image.size)
+    canvas = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+    canvas.paste(image, ((side - image.width) // 2, (side - image.height) // 2))
+    return canvas
+
+
+def build_assets(static_folder, log=print):
+    """Build static/dist and its manifest, returning the manifest dict"""
+    from PIL import Image, features
+
+    out_root = os.path.join(static_folder, DIST_DIR)
+    # dist/css belongs to `flask build-css`
+    if os.path.isdir(out_root):
+        for entry in os.listdir(out_root):
+            if entry != 'css':
+                path = os.path.join(out_root, entry)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    formats = [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+    manifest = {'files': {}, 'variants': {}}
+
+    def emit(logical_path, data):
+        output = fingerprint(f"{DIST_DIR}/{logical_path}", data)
+        path = os.path.join(static_folder, output)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return output
+
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != out_root]
+        for name in sorted(files):
+            if name in SKIP_FILES:
+                continue
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in IMAGE_EXTENSIONS:
+                manifest['files'][logical] = emit(logical, data)
+                continue
+
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            recompressed = _recompress(image, 'png' if ext == '.png' else 'jpeg')
+            if len(recompressed) < len(data):
+                data = recompressed
+            manifest['files'][logical] = emit(logical, data)
+
+            variants = []
+            widths = [w for w in RESPONSIVE_WIDTHS if w < image.width] + [image.width]
+            for width in widths:
+                resized = image if width == image.width else \
+                    image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                for fmt in formats:
+                    variant_path = f"{os.path.splitext(logical)[0]}-{width}w.{fmt}"
+                    variants.append({'path': emit(variant_path, _recompress(resized, fmt)),
+                                     'format': fmt, 'width': width})
+            manifest['variants'][logical] = variants
+            log(f"{logical}: {len(data) // 1024} KB, {len(variants)} variants")
+
+    # Favicon set cut from the square-padded logo
+    icon = _square(Image.open(os.path.join(static_folder, FAVICON_SOURCE)).convert('RGBA'))
+    manifest['files']['favicon.ico'] = emit('favicon.ico', _recompress(icon.resize((48, 48), Image.LANCZOS), 'ico'))
+    for logical, size in (('favicon-32.png', 32), ('apple-touch-icon.png', 180),
+                          ('icon-192.png', 192), ('icon-512.png', 512)):
+        manifest['files'][logical] = emit(logical, _recompress(icon.resize((size, size), Image.LANCZOS), 'png'))
+
+    with open(os.path.join(out_root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
@@ -0,0 +1,17 @@
+"""
+Load tests for the CyberStudy app
+
+    python -m benchmarks.run                      # compare against baselines.json
+    python -m benchmarks.run --save-baseline      # record new baselines
+    python -m benchmarks.run --mode gunicorn --sizes 1000
+    python -m benchmarks.run --mode all --sizes 1000 --slow-clients 16
+
+Each run generates a synthetic users.json of 10, 1k and 100k parents in a
+temporary directory and starts the app there, either in a subprocess driven
+through Flask's test client (in-process: app cost only) or under a local
+gunicorn with the production flags from start.sh (over HTTP), with threaded
+workers or with the ASGI workers of asgi.py. --slow-clients keeps that many
+trickling uploads open during a server run, which is where the ASGI mode
+keeps serving while the threaded one runs out of threads. Baselines are
+machine specific: record them on the machine that runs the comparison.
+"""
@@ -0,0 +1,206 @@
+"""
+Run the benchmark scenarios and compare them against stored baselines
+
+Exits with status 1 when a scenario's p95 latency or throughput is worse
+than its baseline by more than --tolerance, or when it returned errors.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.workload import SCENARIOS, run_scenario, slow_clients, write_users
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'baselines.json')
+
+# start.sh minus --max-requests, so a worker restart doesn't land mid-run; one
+# worker process either way, so the two servers compare like for like
+SERVER_ARGS = {
+    'gunicorn': ['--workers', '1', '--threads', '8', '--timeout', '0', '--keep-alive', '2', '--preload',
+                 'app:create_app()'],
+    'asgi': ['--worker-class', 'uvicorn.workers.UvicornWorker', '--workers', '1', '--timeout', '0',
+             '--keep-alive', '2', '--preload', 'asgi:application'],
+}
+
+
+def _app_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def _selected(names):
+    return [scenario for scenario in SCENARIOS if not names or scenario.name in names]
+
+
+def prepare_data(data_dir, parents):
+    """Write synthetic users plus the demo and admin accounts the scenarios sign in as"""
+    write_users(os.path.join(data_dir, 'users.json'), parents)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'seed-users'], cwd=data_dir, env=_app_env(),
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+def run_in_process(data_dir, args):
+    """Run the scenarios against the app through Flask's test client, in a fresh interpreter"""
+    output = os.path.join(data_dir, 'results.json')
+    command = [sys.executable, '-m', 'benchmarks.run', '--worker', output,
+               '--requests', str(args.requests), '--concurrency', str(args.concurrency or 1)]
+    if args.scenarios:
+        command += ['--scenarios', ','.join(args.scenarios)]
+    # The app logs JSON to stdout; keep it out of the report
+    with open(os.path.join(data_dir, 'app.log'), 'w') as log:
+        subprocess.run(command, cwd=data_dir, env=_app_env(), stdout=log, check=True)
+    with open(output) as f:
+        return json.load(f)
+
+
+def worker_main(output, args):
+    """Entry point of the in-process run; the working directory holds the data files"""
+    from app import create_app
+    app = create_app()
+
+    def make_client():
+        client = app.test_client()
+
+        def send(method, path, body):
+            return client.open(path, method=method, json=body).status_code
+        return send
+
+    results = {scenario.name: run_scenario(scenario, make_client, args.requests, args.concurrency)
+               for scenario in _selected(args.scenarios)}
+    with open(output, 'w') as f:
+        json.dump(results, f)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_server(data_dir, args, mode):
+    """Run the scenarios over HTTP against a local gunicorn, threaded or with ASGI workers"""
+    import requests
+
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    log = open(os.path.join(data_dir, 'app.log'), 'w')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}'] + SERVER_ARGS[mode],
+                              cwd=data_dir, env=_app_env(), stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 300
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited, see {log.name}")
+            try:
+                requests.get(base + '/robots.txt', timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn didn't start within 5 minutes")
+                time.sleep(0.2)
+
+        def make_client():
+            http = requests.Session()
+
+            def send(method, path, body):
+                try:
+                    return http.request(method, base + path, json=body, timeout=60).status_code
+                except requests.RequestException:
+                    return 599  # counted as an error
+            return send
+
+        with slow_clients('127.0.0.1', port, args.slow_clients):
+            return {scenario.name: run_scenario(scenario, make_client, args.requests, args.concurrency or 8)
+                    for scenario in _selected(args.scenarios)}
+    finally:
+        server.terminate()
+        server.wait()
+        log.close()
+
+
+def compare(results, baselines, tolerance):
+    """Print each result next to its baseline; return the keys that regressed"""
+    regressions = []
+    print(f"{'benchmark':<45} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  vs baseline")
+    for key, result in sorted(results.items()):
+        base = baselines.get(key)
+        note = 'no baseline'
+        if base:
+            p95_change = result['p95'] / base['p95'] - 1 if base['p95'] else 0.0
+            rps_change = result['rps'] / base['rps'] - 1 if base['rps'] else 0.0
+            note = f"p95 {p95_change:+.0%}, rps {rps_change:+.0%}"
+            if p95_change > tolerance or rps_change < -tolerance:
+                regressions.append(key)
+                note += '  REGRESSION'
+        if result['errors']:
+            regressions.append(key)
+            note += f"  {result['errors']} errors"
+        print(f"{key:<45} {result['rps']:>9} {result['p50']:>9} {result['p95']:>9} {result['p99']:>9}  {note}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn', 'asgi', 'all'], default='inprocess')
+    parser.add_argument('--sizes', default='10,1000,100000', help='comma-separated parent counts')
+    parser.add_argument('--scenarios', type=lambda value: value.split(','), help='comma-separated scenario names')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--concurrency', type=int,
+                        help='client threads (default 1 in-process, 8 against a server)')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='slow uploads kept open against the server while measuring')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, e.g. 0.25 for 25%%')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker_main(args.worker, args)
+        return 0
+
+    modes = ['inprocess', 'gunicorn', 'asgi'] if args.mode == 'all' else [args.mode]
+    results = {}
+    for size in (int(value) for value in args.sizes.split(',')):
+        for mode in modes:
+            with tempfile.TemporaryDirectory(prefix='cyberstudy-bench-') as data_dir:
+                prepare_data(data_dir, size)
+                print(f"Running {mode} with {size} parents...", file=sys.stderr)
+                if mode == 'inprocess':
+                    mode_results = run_in_process(data_dir, args)
+                else:
+                    mode_results = run_server(data_dir, args, mode)
+                    if args.slow_clients:
+                        mode = f'{mode}+{args.slow_clients}slow'
+                for name, result in mode_results.items():
+                    results[f'{mode}/{size}/{name}'] = result
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} baselines to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
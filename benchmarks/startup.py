@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark: import time, create_app() time and first-request latency
+
+    python -m benchmarks.startup                   # compare against baselines.json
+    python -m benchmarks.startup --save-baseline
+
+Every run starts a fresh interpreter in a directory holding a synthetic
+users.json, so nothing is cached between runs; the median of --runs is kept.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.run import BASELINE_PATH, _app_env, prepare_data
+
+METRICS = ('import_ms', 'create_app_ms', 'first_page_ms', 'first_dashboard_ms')
+
+# Runs inside the fresh interpreter; argv[1] is where to write the timings
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get('/')
+first_page = time.perf_counter()
+client.post('/api/signin', json={'email': 'demo@cyberstudy.com', 'password': 'demo123'})
+signed_in = time.perf_counter()
+client.get('/api/dashboard-data')
+dashboard = time.perf_counter()
+with open(sys.argv[1], 'w') as f:
+    json.dump({'import_ms': (imported - start) * 1000, 'create_app_ms': (created - imported) * 1000,
+               'first_page_ms': (first_page - created) * 1000, 'first_dashboard_ms': (dashboard - signed_in) * 1000}, f)
+"""
+
+
+def measure(data_dir, runs):
+    """Median timings over `runs` fresh interpreters"""
+    output = os.path.join(data_dir, 'startup.json')
+    samples = []
+    with open(os.path.join(data_dir, 'app.log'), 'w') as log:
+        for _ in range(runs):
+            subprocess.run([sys.executable, '-c', PROBE, output], cwd=data_dir, env=_app_env(), stdout=log, check=True)
+            with open(output) as f:
+                samples.append(json.load(f))
+    return {metric: round(statistics.median(sample[metric] for sample in samples), 1) for metric in METRICS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,100000', help='comma-separated parent counts')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per size')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, e.g. 0.25 for 25%%')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in (int(value) for value in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory(prefix='cyberstudy-startup-') as data_dir:
+            prepare_data(data_dir, size)
+            print(f"Starting with {size} parents...", file=sys.stderr)
+            results[f'startup/{size}'] = measure(data_dir, args.runs)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} baselines to {args.baseline}")
+        return 0
+
+    regressions = []
+    print(f"{'benchmark':<20}" + ''.join(f"{metric:>20}" for metric in METRICS))
+    for key, result in sorted(results.items()):
+        base = baselines.get(key, {})
+        cells = []
+        for metric in METRICS:
+            cell = f"{result[metric]}"
+            if base.get(metric):
+                change = result[metric] / base[metric] - 1
+                cell += f" ({change:+.0%})"
+                if change > args.tolerance:
+                    regressions.append(f'{key}/{metric}')
+            cells.append(f"{cell:>20}")
+        print(f"{key:<20}" + ''.join(cells))
+    if regressions:
+        print(f"{len(regressions)} startup timings regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+What the benchmarks send, and how the timings are summarized
+"""
+
+import socket
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from datagen import generate_users, write_json_stream
+from passwords import PasswordHasher, percentile
+
+DEMO_LOGIN = {'email': 'demo@cyberstudy.com', 'password': 'demo123'}
+ADMIN_LOGIN = {'email': 'admin@cyberstudy.com', 'password': 'admin123'}
+
+SIGNUP = {
+    'parentName': 'Load Test', 'parentEmail': 'load.test@example.com', 'parentPhone': '555-0100',
+    'parentRelation': 'Parent', 'childName': 'Sam', 'childAge': '10', 'childGrade': '5th',
+    'experienceLevel': 'Beginner', 'schedulePreference': 'Weekends', 'learningGoals': ['Python basics'],
+}
+
+# scale: fraction of --requests sent to the scenario (sign-in is bound by the KDF)
+Scenario = namedtuple('Scenario', 'name method path auth body scale', defaults=(None, None, 1.0))
+
+SCENARIOS = [
+    Scenario('home', 'GET', '/'),
+    Scenario('curriculum', 'GET', '/curriculum'),
+    Scenario('stylesheet', 'GET', '/static/stylesheet/styles.css'),
+    Scenario('signin', 'POST', '/api/signin', body=DEMO_LOGIN, scale=0.1),
+    Scenario('dashboard_data', 'GET', '/api/dashboard-data', auth=DEMO_LOGIN),
+    Scenario('admin_summary', 'GET', '/api/admin/summary', auth=ADMIN_LOGIN),
+    Scenario('admin_students', 'GET', '/api/admin/students?limit=50', auth=ADMIN_LOGIN),
+    Scenario('admin_students_search', 'GET', '/api/admin/students?name=a&sort=name&limit=50', auth=ADMIN_LOGIN),
+    Scenario('admin_parents', 'GET', '/api/admin/parents?limit=50', auth=ADMIN_LOGIN),
+    Scenario('signup', 'POST', '/api/signup', body=SIGNUP),
+    Scenario('content_search', 'GET', '/api/search?q=binary+brac'),
+]
+
+WARMUP_REQUESTS = 5
+
+def write_users(path, parents, seed=0):
+    """Write a users.json of synthetic parents"""
+    # Nobody signs in as them, so a cheap hash keeps fixture generation fast
+    write_json_stream(path, generate_users(parents, PasswordHasher(iterations=1000).hash('benchmark'), seed))
+
+
+@contextmanager
+def slow_clients(host, port, count, upload_seconds=2.0, body_bytes=20):
+    """Keep `count` signup uploads in flight, each trickling its body over `upload_seconds`.
+
+    They stand in for clients on bad mobile links: a server that gives each
+    request a thread until its body has arrived has that many fewer threads
+    for everyone else. Each client starts a new upload when one finishes.
+    """
+    stop = threading.Event()
+    body = b'{' + b' ' * (body_bytes - 2) + b'}'
+    head = (f'POST /api/signup HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode()
+
+    def upload_forever():
+        while not stop.is_set():
+            try:
+                with socket.create_connection((host, port), timeout=60) as sock:
+                    sock.sendall(head)
+                    for i in range(len(body)):
+                        if stop.wait(upload_seconds / len(body)):
+                            return
+                        sock.sendall(body[i:i + 1])
+                    while sock.recv(65536):
+                        pass
+            except OSError:
+                stop.wait(0.1)
+
+    threads = [threading.Thread(target=upload_forever, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def run_scenario(scenario, make_client, requests, concurrency):
+    """Send `requests` copies of a scenario from `concurrency` threads.
+
+    make_client() returns a function send(method, path, body) -> status code
+    with its own cookie jar; each thread signs in once before timing starts.
+    Returns a summary dict.
+    """
+    count = max(1, int(requests * scenario.scale))
+    per_thread = [count // concurrency + (1 if i < count % concurrency else 0) for i in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def worker(index):
+        send = make_client()
+        if scenario.auth:
+            send('POST', '/api/signin', scenario.auth)
+        for _ in range(WARMUP_REQUESTS):
+            send(scenario.method, scenario.path, scenario.body)
+        ready.wait()
+        timings = latencies[index]
+        for _ in range(per_thread[index]):
+            start = time.perf_counter()
+            status = send(scenario.method, scenario.path, scenario.body)
+            timings.append(time.perf_counter() - start)
+            if status >= 400:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency) if per_thread[i]]
+    ready = threading.Barrier(len(threads) + 1)
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize([t for timings in latencies for t in timings], elapsed, sum(errors))
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (ms) of one scenario"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50': round(percentile(latencies, 50) * 1000, 3),
+        'p95': round(percentile(latencies, 95) * 1000, 3),
+        'p99': round(percentile(latencies, 99) * 1000, 3),
+    }
@@ -0,0 +1,165 @@
+"""
+Change feed for the admin dashboard
+
+ChangeFeed subscribes to the user store and records every parent-level
+change as a small event carrying the affected rows, in the same shape as the
+admin list APIs return them, so a client that already has the lists can
+patch them instead of loading them again:
+
+    {'id': '<epoch>-<n>', 'type': 'parent_added' | 'parent_updated', 'parent': {...}, 'students': [...]}
+    {'id': '<epoch>-<n>', 'type': 'parent_deleted', 'parent_id': '...'}
+    {'id': '<epoch>-<n>', 'type': 'registration', 'registration_id': '...'}
+
+Event ids are versions: <n> grows by one per event and <epoch> is random
+per process (drawn again in each forked worker), so a version handed out by
+another worker or before a restart is never mistaken for one of ours. Only the last `capacity` events are
+kept. A client whose version is unknown or too old gets a reset instead and
+reloads the lists, as it does when the users were reloaded from storage
+(e.g. written by another worker).
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+from admin_index import PARENT_DEFAULT_FIELDS, STUDENT_FIELDS, parent_row, student_rows
+
+
+def _project(row, fields):
+    return {field: row.get(field) for field in fields}
+
+
+class ChangeFeed:
+    """Versioned in-memory log of admin-visible changes"""
+
+    def __init__(self, user_store, capacity=1000):
+        self.user_store = user_store
+        self._loaded = False
+        self._known = set()  # ids of the parents seen so far, to tell signups from edits
+        self._start(capacity)
+        user_store.subscribe(self._on_change)
+        # With gunicorn --preload the feed is created in the master; each worker
+        # gets a log, epoch and numbering of its own
+        os.register_at_fork(after_in_child=lambda: self._start(capacity))
+
+    def _start(self, capacity):
+        self.epoch = secrets.token_hex(4)
+        self._events = deque(maxlen=capacity)  # (number, event, event as JSON)
+        self._number = 0
+        self._condition = threading.Condition()
+        self._streams = 0
+
+    def _on_change(self, event, payload):
+        if event == 'reload':
+            self._known = {user['id'] for user in payload}
+            # The first load is the starting point, not a change
+            if self._loaded:
+                self._append({'type': 'reset'})
+            self._loaded = True
+        elif event == 'save':
+            if payload.get('role') == 'admin':
+                return
+            added = payload['id'] not in self._known
+            self._known.add(payload['id'])
+            students = student_rows(payload)
+            self._append({
+                'type': 'parent_added' if added else 'parent_updated',
+                'parent': _project(parent_row(payload, students), PARENT_DEFAULT_FIELDS),
+                'students': [_project(row, STUDENT_FIELDS) for row in students],
+            })
+        elif event == 'delete':
+            self._known.discard(payload)
+            self._append({'type': 'parent_deleted', 'parent_id': payload})
+
+    def registration_added(self, registration):
+        """Record a new signup"""
+        self._append({'type': 'registration', 'registration_id': registration['id']})
+
+    def _append(self, event):
+        with self._condition:
+            self._number += 1
+            event = dict(event, id=f'{self.epoch}-{self._number}')
+            self._events.append((self._number, event, json.dumps(event)))
+            self._condition.notify_all()
+
+    def version(self):
+        """The current version, to pass as `since` later"""
+        self.user_store.revision()
+        return f'{self.epoch}-{self._number}'
+
+    def _parse(self, since):
+        """The event number in a version of ours, or None"""
+        epoch, _, number = (since or '').rpartition('-')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    def _after(self, number):
+        """Log entries after event `number`, or None if the client has to
+        reload; called with the condition held"""
+        if number is None or number > self._number:
+            return None
+        if self._events and number < self._events[0][0] - 1:
+            return None
+        entries = [entry for entry in self._events if entry[0] > number]
+        if any(entry[1]['type'] == 'reset' for entry in entries):
+            return None
+        return entries
+
+    def changes(self, since):
+        """Return (events after version `since`, current version); events is
+        None when the client has to reload"""
+        # Picks up writes made by other processes, as a reset
+        self.user_store.revision()
+        with self._condition:
+            entries = self._after(self._parse(since))
+            version = f'{self.epoch}-{self._number}'
+        return (None if entries is None else [entry[1] for entry in entries]), version
+
+    def try_open_stream(self, limit):
+        """Count a new stream unless `limit` are already open"""
+        with self._condition:
+            if self._streams >= limit:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._condition:
+            self._streams -= 1
+
+    def stream(self, since, duration, poll_interval=5.0, heartbeat=5.0):
+        """Yield Server-Sent Events after version `since` for up to `duration` seconds.
+
+        The browser reconnects when the stream ends and resumes from the last
+        event id it saw. A reset is sent as a `reset` event, after which the
+        stream ends. Idle streams send a comment every `heartbeat` seconds;
+        that write is also where the server notices a client that has left.
+        """
+        number = self._parse(since)
+        deadline = time.monotonic() + duration
+        last_sent = time.monotonic()
+        yield 'retry: 2000\n\n'
+        while True:
+            self.user_store.revision()
+            with self._condition:
+                entries = self._after(number)
+                if entries == []:
+                    self._condition.wait(min(poll_interval, max(0.0, deadline - time.monotonic())))
+                    entries = self._after(number)
+                current = self._number
+            if entries is None:
+                yield f'id: {self.epoch}-{current}\nevent: reset\ndata: {{}}\n\n'
+                return
+            if entries:
+                yield ''.join(f"id: {event['id']}\ndata: {text}\n\n" for _, event, text in entries)
+                number = entries[-1][0]
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            if time.monotonic() >= deadline:
+                return
@@ -0,0 +1,103 @@
+"""
+Conditional GETs and compression for the JSON APIs
+
+A response's ETag is derived from the versions of the data it is built
+from (e.g. the stored user version, or the storage signature plus the
+query), never from the body, so a request whose If-None-Match still
+matches is answered 304 before anything is built or serialized. Bodies that
+do get built are kept per ETag as raw, gzip and (if the brotli package is
+installed) brotli bytes, like the page cache does for pages, so a repeat
+load without a validator skips serialization and compression as well.
+
+The inputs must mean the same thing in every worker: a worker may be asked
+to validate an ETag another one handed out.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 1024
+# Per-response compression is on the request path, so cheaper settings than
+# the build-time ones for static files and pages
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_SUFFIXES = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+
+class JSONResponseCache:
+    """Serves JSON payloads with data-version ETags, 304s and compression"""
+
+    def __init__(self, dumps, version, max_entries=256):
+        self.dumps = dumps
+        self.version = version
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # etag -> {encoding: body}
+        self._lock = threading.Lock()
+
+    def etag(self, *parts):
+        """Strong ETag for a payload built from data at these versions"""
+        return hashlib.sha256(repr((self.version,) + parts).encode()).hexdigest()[:24]
+
+    def _variants(self, etag, build):
+        with self._lock:
+            variants = self._entries.get(etag)
+            if variants is not None:
+                self._entries.move_to_end(etag)
+                return variants
+        variants = {'identity': (self.dumps(build()) + '\n').encode('utf-8')}
+        with self._lock:
+            self._entries[etag] = variants
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return variants
+
+    def _encode(self, variants, encoding):
+        """The body in an encoding, compressed on first use"""
+        body = variants.get(encoding)
+        if body is None:
+            raw = variants['identity']
+            if encoding == 'br':
+                body = brotli.compress(raw, quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+            variants[encoding] = body
+        return body
+
+    def respond(self, parts, build, cache_control='private, no-cache'):
+        """Answer the current request with build()'s payload, versioned by parts.
+
+        build is only called if the client's copy is stale and the body isn't
+        cached already; its exceptions propagate.
+        """
+        etag = self.etag(*parts)
+        headers = {'Vary': 'Accept-Encoding', 'Cache-Control': cache_control}
+
+        # Any encoding's ETag means the client already has this version
+        for suffix in _SUFFIXES.values():
+            if request.if_none_match.contains(etag + suffix):
+                headers['ETag'] = f'"{etag}{suffix}"'
+                return Response(status=304, headers=headers)
+
+        variants = self._variants(etag, build)
+        encoding = 'identity'
+        if len(variants['identity']) >= MIN_COMPRESS_SIZE:
+            accepted = request.accept_encodings
+            if brotli is not None and accepted['br']:
+                encoding = 'br'
+            elif accepted['gzip']:
+                encoding = 'gzip'
+        headers['ETag'] = f'"{etag}{_SUFFIXES[encoding]}"'
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self._encode(variants, encoding), mimetype='application/json', headers=headers)
@@ -0,0 +1,437 @@
+"""
+CSS pipeline: tree-shaken, minified, fingerprinted bundle plus per-page
+critical CSS
+
+`flask build-css` downloads Bootstrap (pinned and integrity-checked), merges it
+with stylesheet/styles.css, and drops every rule whose classes/ids never
+appear in templates/*.html. The result is minified and written to
+static/dist/css/ under a content-hashed name. For each template the rules
+needed by the above-the-fold markup (navigation plus the first section) are
+extracted as critical CSS and inlined by base.html, while the full bundle is
+loaded without blocking rendering.
+
+With --self-host, Font Awesome and the Google Fonts are downloaded too,
+tree-shaken into the same bundle, and their font files served from
+static/dist/css/fonts/, so pages make no third-party CSS requests.
+
+Downloads are kept in .build-cache/. `flask fetch-css` fills it ahead of
+time, so `flask build-css --offline` (as run by the Docker build) needs no
+network.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import urllib.parse
+import urllib.request
+
+from markupsafe import Markup
+
+from assets import fingerprint
+
+CSS_DIR = 'dist/css'
+CSS_MANIFEST = 'manifest.json'
+CACHE_DIR = '.build-cache'
+BOOTSTRAP_CSS = ('https://cdn.jsdelivr.net/npm/bootstrap@5.3.8/dist/css/bootstrap.min.css',
+                 'sha384-sRIl4kxILFvY47J16cr9ZwB07vP4J8+LH7qKQnuqkuIAvNWLzeN8tE5YBujZqJLB')
+FONT_AWESOME_CSS = ('https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css', None)
+GOOGLE_FONTS_CSS = ('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800'
+                    '&family=JetBrains+Mono:wght@400;500;600&display=swap', None)
+LOCAL_CSS = ('stylesheet/styles.css',)
+
+# Classes Bootstrap's JavaScript adds at runtime, so they never appear in templates
+SAFELIST = {
+    'show', 'showing', 'hiding', 'fade', 'collapse', 'collapsing', 'collapsed', 'active', 'disabled',
+    'modal-backdrop', 'modal-open', 'modal-static', 'offcanvas-backdrop', 'was-validated',
+    'is-valid', 'is-invalid', 'dropdown-menu-end', 'dropdown-menu-start', 'visually-hidden',
+}
+SAFELIST_PREFIXES = ('tooltip', 'popover', 'bs-tooltip-', 'bs-popover-', 'carousel-item-')
+
+# A modern browser user agent, so Google Fonts serves woff2
+FONT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+NESTED_AT_RULES = ('@media', '@supports', '@container', '@layer')
+
+
+# Parsing
+
+def _skip_string_or_comment(css, i):
+    """If css[i] starts a string or comment, return the index just past it"""
+    if css.startswith('/*', i):
+        end = css.find('*/', i + 2)
+        return len(css) if end == -1 else end + 2
+    if css[i] in '"\'':
+        quote = css[i]
+        i += 1
+        while i < len(css) and css[i] != quote:
+            i += 2 if css[i] == '\\' else 1
+        return i + 1
+    return None
+
+
+def strip_comments(css):
+    """Remove comments, leaving strings intact"""
+    out = []
+    i = 0
+    while i < len(css):
+        end = _skip_string_or_comment(css, i)
+        if end is None:
+            out.append(css[i])
+            i += 1
+        else:
+            if not css.startswith('/*', i):
+                out.append(css[i:end])
+            i = end
+    return ''.join(out)
+
+
+def parse(css):
+    """Split a stylesheet into nodes.
+
+    Returns a list of ('rule', selectors, declarations),
+    ('block', at_prelude, children) for @media-like rules and
+    ('raw', text) for everything kept verbatim (@font-face, @keyframes,
+    @import, ...).
+    """
+    nodes = []
+    i = 0
+    start = 0
+    while i < len(css):
+        end = _skip_string_or_comment(css, i)
+        if end is not None:
+            i = end
+            continue
+        char = css[i]
+        if char == ';':
+            statement = css[start:i].strip()
+            if statement:
+                nodes.append(('raw', statement + ';'))
+            start = i = i + 1
+        elif char == '{':
+            prelude = css[start:i].strip()
+            depth = 1
+            j = i + 1
+            while j < len(css) and depth:
+                end = _skip_string_or_comment(css, j)
+                if end is not None:
+                    j = end
+                    continue
+                if css[j] == '{':
+                    depth += 1
+                elif css[j] == '}':
+                    depth -= 1
+                j += 1
+            body = css[i + 1:j - 1]
+            if prelude.startswith(NESTED_AT_RULES):
+                nodes.append(('block', prelude, parse(body)))
+            elif prelude.startswith('@'):
+                nodes.append(('raw', f"{prelude}{{{body}}}"))
+            else:
+                nodes.append(('rule', split_selectors(prelude), body))
+            start = i = j
+        else:
+            i += 1
+    return nodes
+
+
+def split_selectors(prelude):
+    """Split a selector list on top-level commas"""
+    selectors = []
+    depth = 0
+    current = []
+    for char in prelude:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        if char == ',' and depth == 0:
+            selectors.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    selectors.append(''.join(current).strip())
+    return [selector for selector in selectors if selector]
+
+
+# Tree-shaking
+
+SELECTOR_NAMES = re.compile(r'[.#]((?:[\w-]|\\.)+)')
+
+
+ATTRIBUTE_SELECTOR = re.compile(r'\[([\w-]+)(?:[~|^$*]?=["\']?([\w-]+)["\']?)?\]')
+
+
+class UsedNames:
+    """Class/id names that appear in the templates.
+
+    In strict mode (used for critical CSS) runtime-only classes are not
+    safelisted and attribute selectors must match names in the markup too,
+    since only the initial render matters.
+    """
+
+    def __init__(self, sources, strict=False):
+        self.strict = strict
+        self.names = set() if strict else set(SAFELIST)
+        self.prefixes = set() if strict else set(SAFELIST_PREFIXES)
+        for source in sources:
+            self.add(source)
+
+    def add(self, source):
+        self.names.update(re.findall(r'[A-Za-z_][\w-]*', source))
+        # Classes built in JavaScript, e.g. `bg-${color}` or 'alert-' + type
+        self.prefixes.update(re.findall(r'([A-Za-z][\w-]*-)\$\{', source))
+        self.prefixes.update(re.findall(r'[\'"]([A-Za-z][\w-]*-)[\'"]\s*\+', source))
+
+    def uses(self, name):
+        name = name.replace('\\', '')
+        return name in self.names or name.startswith(tuple(self.prefixes))
+
+    def keeps(self, selector):
+        # Pseudo-elements and pseudo-classes don't name anything in the markup
+        bare = re.sub(r'::?[\w-]+(\([^)]*\))?', '', selector)
+        if self.strict:
+            for attribute, value in ATTRIBUTE_SELECTOR.findall(bare):
+                if not self.uses(attribute) or (value and not self.uses(value)):
+                    return False
+        bare = ATTRIBUTE_SELECTOR.sub('', bare)
+        if self.strict:
+            tags = re.findall(r'(?<![\w.#-])([A-Za-z][\w-]*)', SELECTOR_NAMES.sub('', bare))
+            if not all(self.uses(tag) for tag in tags):
+                return False
+        return all(self.uses(name) for name in SELECTOR_NAMES.findall(bare))
+
+
+def shake(nodes, used):
+    """Return nodes with selectors (and then rules) the markup doesn't use removed"""
+    kept = []
+    for node in nodes:
+        if node[0] == 'rule':
+            selectors = [selector for selector in node[1] if used.keeps(selector)]
+            if selectors:
+                kept.append(('rule', selectors, node[2]))
+        elif node[0] == 'block':
+            children = shake(node[2], used)
+            if children:
+                kept.append(('block', node[1], children))
+        else:
+            kept.append(node)
+    return kept
+
+
+STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+
+
+def _minify_text(text, declarations=False):
+    """Collapse whitespace outside of strings.
+
+    Around ':' only in declarations: in a selector `a :hover` and `a:hover`
+    differ.
+    """
+    punctuation = r'\s*([{};,:])\s*' if declarations else r'\s*([{};,])\s*'
+    parts = STRING.split(text)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(punctuation, r'\1', re.sub(r'\s+', ' ', parts[i]))
+    return ''.join(parts).strip()
+
+
+def serialize(nodes):
+    """Render nodes as minified CSS"""
+    out = []
+    for node in nodes:
+        if node[0] == 'rule':
+            declarations = _minify_text(node[2], declarations=True).rstrip(';')
+            out.append(f"{','.join(_minify_text(s) for s in node[1])}{{{declarations}}}")
+        elif node[0] == 'block':
+            out.append(f"{_minify_text(node[1])}{{{serialize(node[2])}}}")
+        elif '{' in node[1]:
+            # @font-face, @keyframes, ...: the body holds declarations
+            prelude, body = node[1].split('{', 1)
+            out.append(f"{_minify_text(prelude)}{{{_minify_text(body, declarations=True)}")
+        else:
+            out.append(_minify_text(node[1]))
+    return ''.join(out)
+
+
+def above_the_fold(html):
+    """Return the markup a visitor sees first: everything up to the end of the first section"""
+    body_start = html.find('<body')
+    body = html[body_start if body_start != -1 else 0:]
+    first_section = body.find('</section>')
+    return body[:first_section] if first_section != -1 else body[:8000]
+
+
+# Downloads
+
+def fetch(url, cache_dir, integrity=None, user_agent=None, offline=False):
+    """Download a URL once into cache_dir, checking its SRI hash if given.
+
+    With offline, a URL that isn't in cache_dir yet is an error instead.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, hashlib.sha256(url.encode()).hexdigest()[:16])
+    cached = os.path.exists(path)
+    if cached:
+        with open(path, 'rb') as f:
+            data = f.read()
+    elif offline:
+        raise FileNotFoundError(f"{url} is not in {cache_dir}; run `flask fetch-css` first")
+    else:
+        headers = {'User-Agent': user_agent} if user_agent else {}
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as response:
+            data = response.read()
+
+    if integrity:
+        algorithm, expected = integrity.split('-', 1)
+        actual = base64.b64encode(hashlib.new(algorithm, data).digest()).decode()
+        if actual != expected:
+            raise ValueError(f"Integrity check failed for {url}")
+
+    if not cached:
+        with open(path, 'wb') as f:
+            f.write(data)
+    return data
+
+
+URL_REFERENCE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def remote_sources(self_host):
+    """(url, integrity, user_agent) for each third-party stylesheet in the bundle"""
+    remote = [BOOTSTRAP_CSS]
+    if self_host:
+        remote += [FONT_AWESOME_CSS, GOOGLE_FONTS_CSS]
+    return [(url, integrity, FONT_USER_AGENT if 'fonts.googleapis.com' in url else None)
+            for url, integrity in remote]
+
+
+def _resolve(reference, base_url):
+    """(absolute url, fragment) of a url(...) reference, or None for data: URLs"""
+    if reference.startswith('data:'):
+        return None
+    return urllib.parse.urldefrag(urllib.parse.urljoin(base_url, reference))
+
+
+def self_host_urls(css, base_url, static_folder, static_url, cache_dir, offline=False):
+    """Download the url(...) references of a remote stylesheet and point them at local copies.
+
+    The rewritten URLs are absolute, so they also work in CSS inlined into a page.
+    """
+    def replace(match):
+        resolved = _resolve(match.group(2), base_url)
+        if resolved is None:
+            return match.group(0)
+        url, fragment = resolved
+        data = fetch(url, cache_dir, offline=offline)
+        name = os.path.basename(urllib.parse.urlparse(url).path)
+        output = fingerprint(f"{CSS_DIR}/fonts/{name}", data)
+        write_file(os.path.join(static_folder, output), data)
+        return f"url({static_url}/{output}{'#' + fragment if fragment else ''})"
+
+    return URL_REFERENCE.sub(replace, css)
+
+
+def fetch_css(self_host=False, cache_dir=CACHE_DIR):
+    """Download everything build_css needs from the network into cache_dir.
+
+    Returns the number of files. Run before an offline build, e.g. ahead of
+    `docker build`, so the image build itself makes no third-party requests.
+    """
+    count = 0
+    for url, integrity, user_agent in remote_sources(self_host):
+        css = fetch(url, cache_dir, integrity, user_agent).decode('utf-8')
+        count += 1
+        if self_host:
+            for match in URL_REFERENCE.finditer(css):
+                resolved = _resolve(match.group(2), url)
+                if resolved is not None:
+                    fetch(resolved[0], cache_dir)
+                    count += 1
+    return count
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+# Build
+
+def build_css(static_folder, template_folder, render_page, self_host=False, static_url='/static',
+              cache_dir=CACHE_DIR, offline=False, log=print):
+    """Build the CSS bundle and per-template critical CSS, returning the manifest dict.
+
+    render_page(template_name) must return the rendered HTML of a template,
+    which is used to find each page's above-the-fold markup. With offline,
+    every download must already be in cache_dir (see fetch_css).
+    """
+    templates = {}
+    for name in sorted(os.listdir(template_folder)):
+        if name.endswith('.html'):
+            with open(os.path.join(template_folder, name), 'r', encoding='utf-8') as f:
+                templates[name] = f.read()
+    used = UsedNames(templates.values())
+
+    sources = []
+    for url, integrity, user_agent in remote_sources(self_host):
+        css = fetch(url, cache_dir, integrity, user_agent, offline).decode('utf-8')
+        if self_host:
+            css = self_host_urls(css, url, static_folder, static_url, cache_dir, offline)
+        sources.append(strip_comments(css))
+    for path in LOCAL_CSS:
+        with open(os.path.join(static_folder, path), 'r', encoding='utf-8') as f:
+            sources.append(strip_comments(f.read()))
+
+    nodes = parse('\n'.join(sources))
+    # @charset is only valid at the very start, and the bundle is plain UTF-8 anyway
+    nodes = [node for node in nodes if not (node[0] == 'raw' and node[1].startswith('@charset'))]
+    bundle = serialize(shake(nodes, used)).encode('utf-8')
+    bundle_path = fingerprint(f"{CSS_DIR}/bundle.css", bundle)
+    write_file(os.path.join(static_folder, bundle_path), bundle)
+    log(f"Bundle: {sum(len(s) for s in sources) // 1024} KB of sources -> {len(bundle) // 1024} KB")
+
+    critical = {}
+    for name in templates:
+        if name == 'base.html':
+            continue
+        try:
+            html = render_page(name)
+        except Exception as e:
+            log(f"Skipping critical CSS for {name}: {e}")
+            continue
+        critical[name] = serialize(shake(nodes, UsedNames([above_the_fold(html)], strict=True)))
+        log(f"Critical CSS for {name}: {len(critical[name]) // 1024} KB")
+
+    manifest = {'bundle': bundle_path, 'self_hosted': self_host, 'critical': critical}
+    write_file(os.path.join(static_folder, CSS_DIR, CSS_MANIFEST),
+               json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class CSSBundle:
+    """The built bundle as seen by templates"""
+
+    def __init__(self, static_folder):
+        self.path = os.path.join(static_folder, CSS_DIR, CSS_MANIFEST)
+        self.reload()
+
+    def reload(self):
+        try:
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        self.bundle = manifest.get('bundle')
+        self.self_hosted = manifest.get('self_hosted', False)
+        self._critical = manifest.get('critical', {})
+
+    @property
+    def available(self):
+        return self.bundle is not None
+
+    def critical(self, template_name):
+        """Inline critical CSS for a template ('' if none was extracted)"""
+        return Markup(self._critical.get(template_name, ''))
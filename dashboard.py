@@ -0,0 +1,126 @@
+"""
+Parent dashboard payloads built from stored student progress
+
+Admins write each student's `progress` (completed_projects, total_hours,
+achievements, next_class_date, ...) through the admin API; the parent
+dashboard aggregates it per parent. Results are memoized per parent against
+the user store's version token and today's date, so a dashboard load is a
+dict lookup until that parent's record changes or the day rolls over.
+"""
+
+import threading
+from datetime import date
+
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+PROJECTS_PER_LEVEL = 20  # matches the admin dashboard's progress bar
+RECENT_PROJECTS = 3
+
+
+def as_number(value):
+    """Progress fields come from form inputs, so accept numeric strings too"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _next_level(level):
+    if level in LEVELS:
+        return LEVELS[min(LEVELS.index(level) + 1, len(LEVELS) - 1)]
+    return LEVELS[1]
+
+
+def build_dashboard(user, today):
+    """Aggregate the dashboard payload for one parent"""
+    students = user.get('students', [])
+    total_projects = total_hours = achievements = 0
+    percentages = []
+    recent = []
+    upcoming = []
+
+    for student in students:
+        progress = student.get('progress', {})
+        projects = int(as_number(progress.get('completed_projects')))
+        total_projects += projects
+        total_hours += as_number(progress.get('total_hours'))
+        achievements += int(as_number(progress.get('achievements')))
+        percentages.append(min(projects / PROJECTS_PER_LEVEL, 1) * 100)
+
+        level = progress.get('current_level', student.get('level', LEVELS[0]))
+        updated = progress.get('last_updated')
+        if updated:
+            recent.append({
+                'name': f"{student['name']}: {level}",
+                'description': f"{projects} projects completed, {as_number(progress.get('total_hours')):g} hours",
+                'status': 'completed' if projects >= PROJECTS_PER_LEVEL else 'in_progress',
+                'date': updated[:10],
+                'sort_key': updated,
+            })
+
+        next_class = _parse_date(progress.get('next_class_date'))
+        if next_class and next_class >= today:
+            upcoming.append({
+                'title': f"{student['name']}: {level} class",
+                'instructor': 'CyberStudy',
+                'date': next_class.isoformat(),
+                'time': '',
+            })
+
+    recent.sort(key=lambda project: project.pop('sort_key'), reverse=True)
+    upcoming.sort(key=lambda cls: cls['date'])
+    # Show the level of the student furthest along
+    levels = [s.get('progress', {}).get('current_level', s.get('level', LEVELS[0])) for s in students]
+    current_level = max(levels, key=lambda l: LEVELS.index(l) if l in LEVELS else 0, default=LEVELS[0])
+
+    return {
+        'parent_name': user['parent_name'],
+        'stats': {
+            'total_projects': total_projects,
+            'total_hours': round(total_hours, 1),
+            'achievements': achievements,
+            'days_to_next_class': (date.fromisoformat(upcoming[0]['date']) - today).days if upcoming else None,
+        },
+        'progress': {
+            'percentage': round(sum(percentages) / len(percentages)) if percentages else 0,
+            'current_level': current_level,
+            'next_level': _next_level(current_level),
+        },
+        'recent_projects': recent[:RECENT_PROJECTS],
+        'upcoming_classes': upcoming,
+        'achievements': [],
+        'messages': [],
+    }
+
+
+class DashboardCache:
+    """Memoizes build_dashboard per parent"""
+
+    def __init__(self, user_store):
+        self.user_store = user_store
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user, today=None):
+        """Return the dashboard for a user, rebuilding it only if the user or the date changed"""
+        today = today or date.today()
+        key = (self.user_store.version(user['id']), today)
+        entry = self._entries.get(user['id'])
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        payload = build_dashboard(user, today)
+        with self._lock:
+            self._entries[user['id']] = (key, payload)
+        return payload
+
+    def invalidate(self, user_id):
+        """Drop a parent's cached dashboard"""
+        with self._lock:
+            self._entries.pop(user_id, None)
@@ -0,0 +1,148 @@
+"""
+Synthetic users.json and registrations.json for scale testing
+
+Records are generated one at a time from a seeded random.Random and streamed
+straight to disk, so the same seed always gives the same records (only the
+shared password hash gets a fresh salt) and a multi-hundred-MB fixture never
+has to fit in memory. Parents look like the
+accounts the app creates (1-4 students each) and students carry progress in
+the states the admin API leaves them in: never updated, partially filled in
+from form strings, or fully tracked with a next class date. Registrations
+follow the schema written by /api/signup.
+"""
+
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from dashboard import LEVELS
+
+FIRST_NAMES = ('Alex', 'Sam', 'Jordan', 'Taylor', 'Riley', 'Casey', 'Morgan', 'Jamie', 'Avery', 'Quinn',
+               'Maya', 'Noah', 'Priya', 'Liam', 'Zoe', 'Mateo', 'Aisha', 'Ethan', 'Sofia', 'Kai')
+LAST_NAMES = ('Johnson', 'Smith', 'Garcia', 'Chen', 'Patel', 'Okafor', 'Kim', 'Nguyen', 'Lopez', 'Brown',
+              'Müller', 'Rossi', 'Haddad', 'Silva', "O'Brien", 'Kowalski', 'Tanaka', 'Ali', 'Dubois', 'Ivanova')
+RELATIONS = ('Mother', 'Father', 'Guardian', 'Grandparent')
+SCHEDULES = ('Weekday afternoons', 'Weekday evenings', 'Weekends', 'Flexible')
+SESSION_LENGTHS = ('', '30 minutes', '45 minutes', '60 minutes')
+GOALS = ('Python basics', 'Web development', 'Game design', 'Cybersecurity', 'Robotics', 'Data science')
+NOTES = ('', '', 'Great focus this week', 'Needs help with loops', 'Ready for the next level',
+         'Missed one class', 'Finished the capstone early')
+
+START = datetime(2023, 9, 1)
+
+
+def _grade(age):
+    grade = age - 5
+    return {1: '1st', 2: '2nd', 3: '3rd'}.get(grade, f'{grade}th')
+
+
+def _progress(rng, level, enrolled):
+    """A student's progress record, in one of the shapes found in real data"""
+    shape = rng.random()
+    if shape < 0.2:
+        return None  # never updated by an admin
+    level_index = LEVELS.index(level)
+    projects = rng.randint(0, 20) + 20 * level_index
+    hours = round(projects * rng.uniform(1.0, 3.0), 1)
+    updated = enrolled + timedelta(days=rng.randint(7, 500), minutes=rng.randrange(1440))
+    if shape < 0.4:
+        # Saved from the edit form before it sent numbers
+        return {'current_level': level, 'completed_projects': str(projects), 'total_hours': str(hours),
+                'last_updated': updated.isoformat()}
+    return {
+        'current_level': level,
+        'completed_projects': projects,
+        'total_hours': hours,
+        'achievements': projects // 5 + rng.randint(0, 2),
+        'next_class_date': (updated + timedelta(days=rng.randint(-30, 60))).date().isoformat(),
+        'notes': rng.choice(NOTES),
+        'last_updated': updated.isoformat(),
+    }
+
+
+def generate_users(parents, credentials, seed=0):
+    """Yield `parents` parent accounts; every one signs in with the same (password_hash, salt)"""
+    rng = random.Random(seed)
+    password_hash, salt = credentials
+    for i in range(parents):
+        last = rng.choice(LAST_NAMES)
+        created = START + timedelta(days=rng.randrange(700), seconds=rng.randrange(86400))
+        students = []
+        for j in range(rng.choice((1, 1, 1, 2, 2, 3, 4))):
+            age = rng.randint(7, 15)
+            level = rng.choices(LEVELS, weights=(5, 3, 1))[0]
+            enrolled = created + timedelta(days=rng.randint(0, 30))
+            student = {
+                'id': f'student_gen_{i}_{j}',
+                'name': f'{rng.choice(FIRST_NAMES)} {last}',
+                'age': age,
+                'grade': _grade(age),
+                'level': level,
+                'enrolled_date': enrolled.date().isoformat(),
+            }
+            progress = _progress(rng, level, enrolled)
+            if progress:
+                student['progress'] = progress
+            students.append(student)
+        yield {
+            'id': f'user_gen_{i}',
+            'email': f'parent{i}@example.com',
+            'password_hash': password_hash,
+            'salt': salt,
+            'parent_name': f'{rng.choice(FIRST_NAMES)} {last}',
+            'created_at': created.isoformat(),
+            'students': students,
+        }
+
+
+def generate_registrations(count, seed=0):
+    """Yield `count` signups in the /api/signup format, oldest first"""
+    rng = random.Random(seed + 1)
+    moment = START
+    for i in range(count):
+        # At least a second apart, so the timestamp-based ids stay unique
+        moment += timedelta(seconds=rng.randint(1, 3600))
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        age = rng.randint(7, 15)
+        yield {
+            'id': f"REG_{moment.strftime('%Y%m%d_%H%M%S')}",
+            'timestamp': moment.isoformat(),
+            'parent_info': {
+                'name': f'{rng.choice(FIRST_NAMES)} {last}',
+                'email': f'signup{i}@example.com',
+                'phone': f'555-{rng.randrange(10000):04d}',
+                'relation': rng.choice(RELATIONS),
+            },
+            'child_info': {
+                'name': f'{first} {last}',
+                'age': str(age),
+                'grade': rng.choice(('', _grade(age))),
+                'experience_level': rng.choices(LEVELS, weights=(6, 3, 1))[0],
+            },
+            'preferences': {
+                'learning_goals': rng.sample(GOALS, rng.randint(0, 3)),
+                'schedule_preference': rng.choice(SCHEDULES),
+                'session_length': rng.choice(SESSION_LENGTHS),
+                'additional_info': '',
+                'newsletter': rng.random() < 0.4,
+            },
+            'status': rng.choices(('pending', 'contacted', 'enrolled'), weights=(6, 2, 2))[0],
+        }
+
+
+def write_json_stream(path, records):
+    """Write records as a JSON array, one per line, without building the list; return the count"""
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, 'w') as f:
+        f.write('[')
+        for record in records:
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(record, separators=(',', ':')))
+            count += 1
+        f.write('\n]\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return count
@@ -5,6 +5,10 @@
 
 echo "🚀 Deploying CyberStudy updates to Cloud Run..."
 
+# Download the third-party CSS and fonts the image build bundles
+echo "🎨 Fetching third-party CSS..."
+FLASK_APP=app flask fetch-css --self-host || exit 1
+
 # Build and push the new image
 echo "📦 Building and pushing new image..."
 gcloud builds submit --tag us-central1-docker.pkg.dev/tidy-forest-473621-j2/cyberstudy-repo/cyberstudy:latest
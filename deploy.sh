@@ -35,6 +35,10 @@ gcloud services enable cloudbuild.googleapis.com
 gcloud services enable run.googleapis.com
 gcloud services enable containerregistry.googleapis.com
 
+# Download the third-party CSS and fonts the image build bundles
+echo "🎨 Fetching third-party CSS..."
+FLASK_APP=app flask fetch-css --self-host || exit 1
+
 # Build and push the Docker image
 echo "🏗️  Building and pushing Docker image..."
 gcloud builds submit --tag $IMAGE_NAME
@@ -51,7 +55,9 @@ gcloud run deploy $SERVICE_NAME \
     --cpu 1 \
     --min-instances 0 \
     --max-instances 10 \
-    --set-env-vars "FLASK_ENV=production"
+    --set-env-vars "FLASK_ENV=production" \
+    --startup-probe httpGet.path=/readyz,periodSeconds=2,failureThreshold=30 \
+    --liveness-probe httpGet.path=/healthz,periodSeconds=30
 
 # Get the service URL
 SERVICE_URL=$(gcloud run services describe $SERVICE_NAME --region=$REGION --format="value(status.url)")
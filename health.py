@@ -0,0 +1,51 @@
+"""
+Liveness and readiness probes
+
+/healthz only proves the process is serving requests, so it does no work at
+all. /readyz runs a set of named checks (user store loaded, storage writable,
+caches warm) and caches the outcome for a few seconds, so frequent probes
+from Docker and Cloud Run cost at most one round of checks per TTL.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessProbe:
+    """Runs readiness checks, caching the result for `ttl` seconds"""
+
+    def __init__(self, checks, ttl=5.0):
+        # name -> callable returning a truthy value when ready (or raising)
+        self.checks = checks
+        self.ttl = ttl
+        self._result = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _run(self):
+        results = {}
+        for name, check in self.checks.items():
+            try:
+                results[name] = bool(check())
+            except Exception:
+                logger.warning("Readiness check failed", exc_info=True, extra={'check': name})
+                results[name] = False
+        return all(results.values()), results
+
+    def status(self):
+        """Return (ready, {check name: passed})"""
+        if time.monotonic() < self._expires:
+            return self._result
+        # One thread re-runs the checks; the others keep the previous answer meanwhile
+        if not self._lock.acquire(blocking=self._result is None):
+            return self._result
+        try:
+            if time.monotonic() >= self._expires:
+                self._result = self._run()
+                self._expires = time.monotonic() + self.ttl
+            return self._result
+        finally:
+            self._lock.release()
@@ -0,0 +1,165 @@
+"""
+Logging setup: JSON lines written off the request thread
+
+Request threads only put records on an in-memory queue (QueueHandler); a
+listener thread formats them as JSON and writes them to stdout, where Cloud
+Run picks them up. Sensitive fields are redacted by the formatter, and
+high-volume routes can be sampled so only a fraction of their INFO/DEBUG
+records are queued at all.
+
+Configuration (see configure_logging):
+
+* LOG_LEVEL: root level, default INFO
+* LOG_LEVELS: per-module levels, e.g. "storage=DEBUG,werkzeug=WARNING"
+* LOG_SAMPLE: per-route sample rates, e.g. "api_dashboard_data=0.01"
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+REDACTED = '[redacted]'
+# Never logged, at any depth
+REDACT_FIELDS = {'password', 'password_hash', 'salt', 'token', 'newpassword', 'confirmpassword',
+                 'secret_key', 'session', 'cookie', 'authorization'}
+# Logged with the local part masked
+MASK_FIELDS = {'email', 'parent_email', 'parentemail'}
+
+# LogRecord attributes that aren't user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def mask_email(value):
+    local, _, domain = str(value).partition('@')
+    return f"{local[:1]}***@{domain}" if domain else REDACTED
+
+
+def redact(value):
+    """Return a copy of value with sensitive keys redacted, recursively"""
+    if isinstance(value, dict):
+        cleaned = {}
+        for key, item in value.items():
+            lowered = str(key).lower()
+            if lowered in REDACT_FIELDS:
+                cleaned[key] = REDACTED
+            elif lowered in MASK_FIELDS:
+                cleaned[key] = mask_email(item)
+            else:
+                cleaned[key] = redact(item)
+        return cleaned
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with `extra` fields redacted"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'severity': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        extra = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        entry.update(redact(extra))
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with only the work that must happen on the calling thread.
+
+    The stock handler formats and copies every record before queueing it;
+    JSONFormatter does the formatting on the listener thread instead.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO/DEBUG records tagged with a sampled route"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, 'route', None))
+        return rate is None or random.random() < rate
+
+
+def _parse_pairs(value, convert):
+    pairs = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            key, _, setting = item.partition('=')
+            pairs[key.strip()] = convert(setting.strip())
+    return pairs
+
+
+_listener = None
+
+
+def _start_listener(log_queue, handler):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(config):
+    """Route all logging through a queue to a JSON stdout handler"""
+    # Skip the per-record work the JSON output doesn't use (caller stack
+    # frame lookup, process and multiprocessing names)
+    logging._srcfile = None
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(_parse_pairs(config.get('LOG_SAMPLE'), float)))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in _parse_pairs(config.get('LOG_LEVELS'), str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener(log_queue, output)
+    atexit.register(_stop_listener)
+
+    def restart_in_child():
+        # The listener thread doesn't survive fork (gunicorn --preload), and
+        # the queue may have been mid-put when the parent forked
+        fresh_queue = queue.SimpleQueue()
+        queue_handler.queue = fresh_queue
+        _start_listener(fresh_queue, output)
+
+    os.register_at_fork(after_in_child=restart_in_child)
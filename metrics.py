@@ -0,0 +1,155 @@
+"""
+In-process metrics in Prometheus text format
+
+Every thread records into its own dict, so incrementing a counter or
+observing a histogram never takes a lock; a scrape of /metrics sums the
+per-thread dicts. Metrics are per process: with several gunicorn workers,
+each one reports its own.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shards:
+    """One dict of values per thread, registered on the thread's first write"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._all.append(values)
+            return values
+
+    def snapshot(self):
+        """Copies of every thread's values"""
+        with self._lock:
+            shards = list(self._all)
+        return [dict(shard) for shard in shards]
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+        registry.append(self)
+
+    def _render_labels(self, labels, extra=''):
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        values = self._shards.get()
+        values[labels] = values.get(labels, 0) + amount
+
+    def render(self):
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        for labels, value in sorted(totals.items()):
+            yield f'{self.name}{self._render_labels(labels)} {value}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        values = self._shards.get()
+        counts = values.get(labels)
+        if counts is None:
+            # One count per bucket (and +Inf), then sum and count
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def time(self, *labels):
+        """Decorator observing the wrapped function's duration in seconds"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorator
+
+    def render(self):
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, counts in shard.items():
+                counts = list(counts)
+                merged = totals.setdefault(labels, [0] * len(counts))
+                for i, value in enumerate(counts):
+                    merged[i] += value
+        for labels, counts in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f'{self.name}_bucket{self._render_labels(labels, le)} {cumulative}'
+            yield f'{self.name}_sum{self._render_labels(labels)} {counts[-2]}'
+            yield f'{self.name}_count{self._render_labels(labels)} {counts[-1]}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(registry):
+    """The registry in Prometheus text exposition format"""
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(obj, histogram, methods):
+    """Time the given methods of an object, labelled by method name"""
+    for name in methods:
+        setattr(obj, name, histogram.time(name)(getattr(obj, name)))
+    return obj
+
+
+REGISTRY = []
+
+REQUESTS = Counter(REGISTRY, 'cyberstudy_requests_total', 'HTTP requests by endpoint, method and status',
+                   ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = Histogram(REGISTRY, 'cyberstudy_request_duration_seconds', 'HTTP request latency by endpoint',
+                            ('endpoint',))
+STORAGE_SECONDS = Histogram(REGISTRY, 'cyberstudy_storage_seconds', 'Time spent in storage backend calls',
+                            ('operation',))
+RENDER_SECONDS = Histogram(REGISTRY, 'cyberstudy_template_render_seconds', 'Jinja template render time',
+                           ('template',))
+PASSWORD_SECONDS = Histogram(REGISTRY, 'cyberstudy_password_seconds', 'Password hashing and verification time',
+                             ('operation',), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
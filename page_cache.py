@@ -0,0 +1,125 @@
+"""
+Full-page response cache for the static marketing pages
+
+The marketing pages never depend on the request, so each one is rendered
+once per build version and kept as raw, gzip and (if the brotli package is
+installed) brotli bytes with strong ETags. Conditional GETs are answered
+with 304 without touching Jinja.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import Response, render_template, request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class CachedPage:
+    """Pre-rendered bytes of one page, with compressed variants"""
+
+    def __init__(self, body, etag):
+        self.variants = {'identity': (body, f'"{etag}"')}
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9), f'"{etag}-gz"')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f'"{etag}-br"')
+
+    def etags(self):
+        return [etag.strip('"') for _, etag in self.variants.values()]
+
+
+def build_version(app, extra_files=()):
+    """Identify the current build from the environment or the template sources"""
+    version = os.environ.get('BUILD_VERSION') or os.environ.get('K_REVISION')
+    if version:
+        return version
+
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(name.encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    for path in extra_files:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class PageCache:
+    """Renders pages once per build version and serves them from memory"""
+
+    def __init__(self, app, extra_files=()):
+        self.app = app
+        self.extra_files = extra_files
+        self.version = build_version(app, extra_files)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def _render(self, template):
+        with self.app.test_request_context('/'):
+            body = render_template(template).encode('utf-8')
+        etag = hashlib.sha256(self.version.encode() + body).hexdigest()[:24]
+        return CachedPage(body, etag)
+
+    def get(self, template):
+        """Return the CachedPage for a template, rendering it on first use"""
+        page = self._pages.get(template)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(template)
+                if page is None:
+                    page = self._pages[template] = self._render(template)
+        return page
+
+    def warm(self, templates):
+        """Pre-render a list of templates"""
+        for template in templates:
+            self.get(template)
+
+    def is_warm(self, templates):
+        """Whether every one of the templates has been rendered for the current version"""
+        return all(template in self._pages for template in templates)
+
+    def clear(self):
+        """Drop all rendered pages, e.g. after a deploy changes the build version"""
+        with self._lock:
+            self._pages = {}
+            self.version = build_version(self.app, self.extra_files)
+
+    def response(self, template):
+        """Serve a cached page for the current request"""
+        if self.app.debug:
+            # Templates auto-reload in debug mode, so render them every time
+            return render_template(template)
+
+        page = self.get(template)
+        accepted = request.accept_encodings
+        if 'br' in page.variants and accepted['br']:
+            encoding = 'br'
+        elif accepted['gzip']:
+            encoding = 'gzip'
+        else:
+            encoding = 'identity'
+        body, etag = page.variants[encoding]
+
+        headers = {
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': 'public, no-cache',
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        # Any variant's ETag means the client already has this version of the page
+        if any(request.if_none_match.contains(tag) for tag in page.etags()):
+            return Response(status=304, headers=headers)
+
+        return Response(body, mimetype='text/html', headers=headers)
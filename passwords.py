@@ -0,0 +1,167 @@
+"""
+Password hashing with a tunable KDF and a bounded verification pool
+
+Hashes are stored with their parameters encoded in the password_hash field,
+so each user keeps the work factor they were hashed with:
+
+    pbkdf2_sha256$<iterations>$<hex digest>
+    scrypt$<n>$<r>$<p>$<hex digest>
+
+A bare 64-character hex digest is a legacy single-round SHA-256 hash. Those
+still verify, and needs_rehash() flags them (and any hash made with older
+parameters) so sign-in can upgrade them transparently.
+"""
+
+import hashlib
+import hmac
+import math
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords with the configured KDF"""
+
+    def __init__(self, algorithm='pbkdf2_sha256', iterations=300000, scrypt_n=2 ** 14, scrypt_r=8, scrypt_p=1):
+        if algorithm not in ('pbkdf2_sha256', 'scrypt'):
+            raise ValueError(f"Unknown password KDF: {algorithm}")
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.scrypt_n = scrypt_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
+
+    def _params(self):
+        """Return the current parameters as they appear in an encoded hash"""
+        if self.algorithm == 'scrypt':
+            return [str(self.scrypt_n), str(self.scrypt_r), str(self.scrypt_p)]
+        return [str(self.iterations)]
+
+    @staticmethod
+    def _digest(password, salt, algorithm, params):
+        if algorithm == 'pbkdf2_sha256':
+            return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), int(params[0])).hex()
+        if algorithm == 'scrypt':
+            n, r, p = (int(value) for value in params)
+            return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                                  maxmem=256 * n * r + 2 ** 20).hex()
+        raise ValueError(f"Unknown password KDF: {algorithm}")
+
+    def hash(self, password):
+        """Hash a password, returning (encoded_hash, salt)"""
+        salt = secrets.token_hex(16)
+        params = self._params()
+        digest = self._digest(password, salt, self.algorithm, params)
+        return '$'.join([self.algorithm] + params + [digest]), salt
+
+    def verify(self, password, stored_hash, salt):
+        """Verify a password against an encoded or legacy hash"""
+        if '$' not in stored_hash:
+            digest = hashlib.sha256((password + salt).encode()).hexdigest()
+            return hmac.compare_digest(digest, stored_hash)
+
+        algorithm, *params, expected = stored_hash.split('$')
+        try:
+            digest = self._digest(password, salt, algorithm, params)
+        except ValueError:
+            return False
+        return hmac.compare_digest(digest, expected)
+
+    def needs_rehash(self, stored_hash):
+        """Return True if a hash was not made with the current algorithm and parameters"""
+        if '$' not in stored_hash:
+            return True
+        algorithm, *params, _ = stored_hash.split('$')
+        return algorithm != self.algorithm or params != self._params()
+
+
+class VerifierBusy(Exception):
+    """Raised when the verification queue is full or a hash takes too long"""
+
+
+class PasswordVerifier:
+    """Runs password hashing on a small, bounded worker pool.
+
+    At most `workers` hashes run at once and at most `queue_depth` more may
+    wait; further calls fail fast with VerifierBusy instead of tying up the
+    request threads that also serve pages.
+    """
+
+    def __init__(self, hasher, workers=2, queue_depth=16, timeout=5.0):
+        self.hasher = hasher
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise VerifierBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise VerifierBusy()
+
+    def verify(self, password, stored_hash, salt):
+        """Verify a password on the pool"""
+        return self._run(self.hasher.verify, password, stored_hash, salt)
+
+    def hash(self, password):
+        """Hash a password on the pool"""
+        return self._run(self.hasher.hash, password)
+
+
+def benchmark(hasher, samples=20):
+    """Return sorted verification latencies in milliseconds for a hasher"""
+    stored_hash, salt = hasher.hash('benchmark-password')
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.verify('benchmark-password', stored_hash, salt)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+def tune(algorithm, target_ms, samples=20):
+    """Find the strongest work factor whose p99 verification time stays under target_ms.
+
+    PBKDF2 cost is linear in iterations, so one measurement gives a starting
+    estimate that is then stepped down until it meets the target. scrypt N is
+    doubled while it still fits. Returns (hasher, p99_ms).
+    """
+    if algorithm == 'scrypt':
+        best = None
+        n = 2 ** 12
+        while n <= 2 ** 20:
+            hasher = PasswordHasher('scrypt', scrypt_n=n)
+            p99 = percentile(benchmark(hasher, samples), 99)
+            if p99 > target_ms:
+                break
+            best = (hasher, p99)
+            n *= 2
+        return best or (PasswordHasher('scrypt', scrypt_n=2 ** 12), p99)
+
+    probe = PasswordHasher('pbkdf2_sha256', iterations=50000)
+    per_iteration = percentile(benchmark(probe, samples), 99) / 50000
+    iterations = max(10000, int(target_ms * 0.9 / per_iteration) // 10000 * 10000)
+    while True:
+        hasher = PasswordHasher('pbkdf2_sha256', iterations=iterations)
+        p99 = percentile(benchmark(hasher, samples), 99)
+        if p99 <= target_ms or iterations <= 10000:
+            return hasher, p99
+        iterations = max(10000, int(iterations * 0.9) // 10000 * 10000)
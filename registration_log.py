@@ -0,0 +1,187 @@
+"""
+Append-only JSON-Lines log for signup registrations
+
+/api/signup used to read the whole registrations.json, append one record and
+rewrite the file. RegistrationLog instead queues the record and returns
+immediately; a background writer appends pending records in batches (every
+`batch_size` records or `flush_interval` seconds, whichever comes first) and
+fsyncs once per batch.
+
+The log is guarded by an fcntl lock per batch, so compact() can safely fold
+it into the legacy JSON array while the app is running.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationLog:
+    """Group-committed, append-only registration log"""
+
+    def __init__(self, path='registrations.jsonl', batch_size=100, flush_interval=0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def _ensure_writer(self):
+        """Start the writer thread in this process (again, after a fork)"""
+        if self._writer is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._writer = threading.Thread(target=self._run, name='registration-log', daemon=True)
+            self._writer.start()
+
+    def append(self, registration):
+        """Queue a registration for writing and return its id"""
+        self._ensure_writer()
+        self._queue.put(registration)
+        return registration['id']
+
+    def flush(self):
+        """Block until every queued registration has been written"""
+        if self._writer is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _next_batch(self):
+        """Wait for one record, then gather more until the batch is full or the interval ends"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        """Append a batch of records with a single write and fsync"""
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in batch)
+        with open(self.path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            while True:
+                try:
+                    self._write_batch(batch)
+                    break
+                except OSError as e:
+                    logger.warning("Registration log write failed, retrying: %s", e)
+                    time.sleep(1)
+            for _ in batch:
+                self._queue.task_done()
+
+    def read(self):
+        """Return all logged registrations, skipping a torn final line"""
+        try:
+            with open(self.path, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+
+        registrations = []
+        for line in lines:
+            try:
+                registrations.append(json.loads(line))
+            except ValueError:
+                continue
+        return registrations
+
+    def read_from(self, offset):
+        """Return (records, end) for the complete lines from byte offset on.
+
+        end is just past the last complete line, so a line still being
+        written is read on the next call instead.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+
+        complete = data[:data.rfind(b'\n') + 1]
+        registrations = []
+        for line in complete.splitlines():
+            try:
+                registrations.append(json.loads(line))
+            except ValueError:
+                continue
+        return registrations, offset + len(complete)
+
+    def compact(self, legacy_path):
+        """Fold the log into the legacy JSON array file and truncate the log.
+
+        Records already present in the legacy file (same id and timestamp) are
+        skipped, so re-running after an interrupted compaction is harmless.
+        Returns the number of records in the legacy file afterwards.
+        """
+        self.flush()
+        with open(self.path, 'a+') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                registrations = load_json_array(legacy_path)
+                seen = {(r['id'], r['timestamp']) for r in registrations}
+                for record in self.read():
+                    if (record['id'], record['timestamp']) not in seen:
+                        registrations.append(record)
+                        seen.add((record['id'], record['timestamp']))
+
+                write_json_array(legacy_path, registrations)
+                log.truncate(0)
+                os.fsync(log.fileno())
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+        return len(registrations)
+
+
+def load_json_array(path):
+    """Load a JSON array file, or [] if it does not exist"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def write_json_array(path, records):
+    """Write a JSON array file via a temporary file and atomic rename"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(records, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # Make the rename itself durable
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
@@ -0,0 +1,224 @@
+"""
+Full-text search over the teaching content in CyberStudy/docs
+
+Each doc is split into sections at its headings, and the sections go into an
+in-memory inverted index ranked with BM25 (title words count extra). The last
+word of a query is also matched as a prefix, so results and completions can
+follow the user's typing.
+
+Docs are checked for changes at most once per CHECK_INTERVAL seconds; only
+the files whose mtime or size changed are parsed and tokenized again, the
+other files' postings are reused.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Which page of the site each doc's content is published on
+DOC_PAGES = {
+    'UnpluggedActivities.txt': '/unplugged_activities',
+    'Pedagogy.txt': '/teaching_approach',
+    'founder.txt': '/about',
+}
+
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 3
+MAX_PREFIX_TERMS = 50
+SNIPPET_CHARS = 180
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SEPARATOR = re.compile(r"^-{10,}$")
+_NUMBERED_HEADING = re.compile(r"^(\d+\.\d+|Concept \d+:|Introduction:)\s")
+_TITLE_LINE = re.compile(r"^[A-Z][\w '&,:()/-]*[\w)]$")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _is_heading(line, previous, following):
+    """Headings are numbered ("2.1 Activity: ..."), follow a separator, or are
+    short unpunctuated lines that introduce a paragraph"""
+    if not line or len(line) > 80 or _SEPARATOR.match(line):
+        return False
+    if _SEPARATOR.match(previous) or _NUMBERED_HEADING.match(line):
+        return True
+    return bool(_TITLE_LINE.match(line)) and len(following) > 100 and not following[0].isspace()
+
+
+def parse_sections(name, text):
+    """Split a doc into [{'title', 'text'}] at its headings; the first line is the doc title"""
+    lines = [line.rstrip() for line in text.splitlines()]
+    sections = []
+    title, body = lines[0].strip() if lines else name, []
+    previous = ''
+    for i, line in enumerate(lines[1:], 1):
+        following = next((l for l in lines[i + 1:] if l.strip()), '')
+        if _is_heading(line.strip(), previous, following):
+            if body:
+                sections.append({'title': title, 'text': ' '.join(body)})
+            title, body = line.strip(), []
+        elif line.strip() and not _SEPARATOR.match(line.strip()):
+            body.append(line.strip())
+        if line.strip():
+            previous = line.strip()
+    if body:
+        sections.append({'title': title, 'text': ' '.join(body)})
+    return sections
+
+
+class _Snapshot:
+    """An immutable index over every section; replaced as a whole on rebuild"""
+
+    def __init__(self, files):
+        self.sections = []
+        self.postings = {}  # term -> [(section index, weighted tf)]
+        lengths = []
+        for name in sorted(files):
+            for section, terms in files[name]['sections']:
+                index = len(self.sections)
+                self.sections.append(section)
+                lengths.append(sum(terms.values()))
+                for term, tf in terms.items():
+                    self.postings.setdefault(term, []).append((index, tf))
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        self.vocabulary = sorted(self.postings)
+        count = len(self.sections)
+        self.idf = {term: math.log(1 + (count - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def complete(self, prefix):
+        """Indexed terms starting with prefix, most common first"""
+        start = bisect_left(self.vocabulary, prefix)
+        matches = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        matches.sort(key=lambda term: -len(self.postings[term]))
+        return matches[:MAX_PREFIX_TERMS]
+
+    def _bm25(self, term, scores, weight=1.0):
+        idf = self.idf[term]
+        for index, tf in self.postings[term]:
+            norm = K1 * (1 - B + B * self.lengths[index] / self.average_length)
+            scores[index] = scores.get(index, 0.0) + weight * idf * tf * (K1 + 1) / (tf + norm)
+
+    def search(self, query, limit, prefix=True):
+        terms = tokenize(query)
+        if not terms:
+            return [], []
+        # The word being typed is matched as a prefix, unless the query ends with a space
+        partial = terms.pop() if prefix and not query[-1:].isspace() else None
+        scores = {}
+        for term in set(terms):
+            if term in self.postings:
+                self._bm25(term, scores)
+        completions = []
+        if partial:
+            completions = self.complete(partial)
+            # Each section scores by its best completion, so short prefixes don't add up
+            best = {}
+            for term in completions:
+                term_scores = {}
+                # An exact match beats a longer word that merely starts with it
+                self._bm25(term, term_scores, 1.0 if term == partial else 0.8)
+                for index, score in term_scores.items():
+                    best[index] = max(best.get(index, 0.0), score)
+            for index, score in best.items():
+                scores[index] = scores.get(index, 0.0) + score
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        highlight = set(terms) | set(completions[:5])
+        results = [dict(self.sections[index], score=round(score, 4),
+                        snippet=_snippet(self.sections[index]['text'], highlight)) for index, score in ranked]
+        for result in results:
+            del result['text']
+        return results, completions[:10]
+
+
+def _snippet(text, terms):
+    """About SNIPPET_CHARS of text around the first query term"""
+    lowered = text.lower()
+    positions = [match.start() for term in terms
+                 for match in [re.search(r'\b' + re.escape(term), lowered)] if match]
+    start = max(0, min(positions) - SNIPPET_CHARS // 3) if positions else 0
+    if start:
+        start = text.find(' ', start) + 1
+    end = start + SNIPPET_CHARS
+    snippet = text[start:end]
+    if end < len(text):
+        snippet = snippet[:snippet.rfind(' ')] + '…'
+    return ('…' if start else '') + snippet
+
+
+class SearchIndex:
+    """BM25 index over a directory of text docs, kept up to date as they change"""
+
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, docs_dir, pages=DOC_PAGES):
+        self.docs_dir = docs_dir
+        self.pages = pages
+        self._files = {}  # name -> {'signature', 'sections': [(section, term counts)]}
+        self._snapshot = _Snapshot({})
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _signature(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _parse_file(self, name, path):
+        with open(path, encoding='utf-8') as f:
+            sections = parse_sections(name, f.read())
+        indexed = []
+        for number, section in enumerate(sections):
+            terms = Counter(tokenize(section['text']))
+            for term in tokenize(section['title']):
+                terms[term] += TITLE_WEIGHT
+            indexed.append(({'id': f"{os.path.splitext(name)[0].lower()}-{number}", 'doc': name,
+                             'title': section['title'], 'url': self.pages.get(name, ''),
+                             'text': section['text']}, terms))
+        return indexed
+
+    def refresh(self, force=False):
+        """Re-index the docs that changed since the last check; return how many did"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.CHECK_INTERVAL:
+            return 0
+        with self._lock:
+            if not force and now - self._checked < self.CHECK_INTERVAL:
+                return 0
+            self._checked = now
+            files = {}
+            changed = 0
+            for name in self.pages:
+                path = os.path.join(self.docs_dir, name)
+                try:
+                    signature = self._signature(path)
+                except OSError:
+                    continue
+                known = self._files.get(name)
+                if known and known['signature'] == signature:
+                    files[name] = known
+                    continue
+                files[name] = {'signature': signature, 'sections': self._parse_file(name, path)}
+                changed += 1
+            if changed or files.keys() != self._files.keys():
+                self._files = files
+                self._snapshot = _Snapshot(files)
+            return changed
+
+    def search(self, query, limit=10, prefix=True):
+        """Return (results, completions) for a query, best match first"""
+        self.refresh()
+        return self._snapshot.search(query, limit, prefix)
+
+    def __len__(self):
+        return len(self._snapshot.sections)
@@ -0,0 +1,247 @@
+"""
+Server-side sessions
+
+By default sessions are Flask's signed cookies, which every instance behind
+the service can read. Server-side sessions are opt-in: the session cookie
+then only carries a random session id, and the data lives in a backend,
+indexed by user id so every session of a user can be revoked at once
+(account deleted, password reset). Two backends are provided:
+
+* MemorySessionBackend: an LRU dict with expiry, for a single process
+* SQLiteSessionBackend: a table in a SQLite database (WAL mode), which
+  survives gunicorn recycling its worker and is shared between workers on
+  the same disk, but not between instances that don't share one
+
+Select one with SESSION_BACKEND ('cookie', 'memory' or 'sqlite', see
+get_session_interface).
+
+Expiry slides: a session that is used is extended to a full lifetime again,
+at most once per `refresh_interval` so reads don't turn into a write on
+every request.
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data plus the id it is stored under"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        # Signing in as someone else gets a fresh id (no session fixation)
+        self.original_user_id = (initial or {}).get('user_id')
+
+
+class MemorySessionBackend:
+    """Sessions in a bounded LRU dict; the least recently used are evicted first"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()  # sid -> (user_id, data, expires_at)
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                self._remove(sid)
+                return None
+            self._sessions.move_to_end(sid)
+            return dict(entry[1]), entry[2]
+
+    def set(self, sid, user_id, data, expires_at):
+        with self._lock:
+            self._remove(sid)
+            self._sessions[sid] = (user_id, dict(data), expires_at)
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(sid)
+            while len(self._sessions) > self.max_entries:
+                self._remove(next(iter(self._sessions)))
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (entry[0], entry[1], expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._remove(sid)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for sid in list(self._by_user.get(user_id, ())):
+                self._remove(sid)
+
+    def _remove(self, sid):
+        entry = self._sessions.pop(sid, None)
+        if entry is not None and entry[0] is not None:
+            sids = self._by_user.get(entry[0])
+            sids.discard(sid)
+            if not sids:
+                del self._by_user[entry[0]]
+
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid TEXT PRIMARY KEY,
+    user_id TEXT,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+"""
+
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite table, with an index on user_id for revocation"""
+
+    # Expired rows are swept on roughly one write in this many
+    SWEEP_EVERY = 500
+
+    def __init__(self, path='sessions.db'):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Opened (and the database created) on first use, not at import
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SESSION_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._connection().execute(
+            'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at >= ?', (sid, time.time())).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, sid, user_id, data, expires_at):
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO sessions (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+                     (sid, user_id, json.dumps(data), expires_at))
+        if secrets.randbelow(self.SWEEP_EVERY) == 0:
+            conn.execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))
+
+    def touch(self, sid, expires_at):
+        self._connection().execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (expires_at, sid))
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def delete_user(self, user_id):
+        self._connection().execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing sessions in a backend"""
+
+    def __init__(self, backend, ttl=86400, refresh_interval=300):
+        self.backend = backend
+        # Lifetime of non-permanent sessions; permanent ones use PERMANENT_SESSION_LIFETIME
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+
+    def _lifetime(self, app, session):
+        return app.permanent_session_lifetime.total_seconds() if session.permanent else self.ttl
+
+    def open_session(self, app, request):
+        # Static files never look at the session, so don't pay for a lookup
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return self.make_null_session(app)
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            found = self.backend.get(sid)
+            if found is not None:
+                return ServerSession(found[0], sid=sid, expires_at=found[1])
+        return ServerSession(sid=None, new=True)
+
+    def save_session(self, app, session, response):
+        if not isinstance(session, ServerSession):
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and session.sid:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            # Extend a session in use, unless that was done in the last refresh_interval
+            now = time.time()
+            lifetime = self._lifetime(app, session)
+            if session.sid and session.expires_at is not None \
+                    and session.expires_at - now < lifetime - self.refresh_interval:
+                self.backend.touch(session.sid, now + lifetime)
+                self._set_cookie(app, session, response)
+            return
+
+        if session.sid is None or session.get('user_id') != session.original_user_id:
+            if session.sid:
+                self.backend.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.original_user_id = session.get('user_id')
+
+        self.backend.set(session.sid, session.get('user_id'), dict(session), time.time() + self._lifetime(app, session))
+        self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        response.set_cookie(self.get_cookie_name(app), session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=self.get_cookie_domain(app),
+                            path=self.get_cookie_path(app), secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+
+    def revoke_user(self, user_id):
+        """End every session of a user immediately"""
+        self.backend.delete_user(user_id)
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """Flask's signed-cookie sessions: nothing is stored server-side"""
+
+    def revoke_user(self, user_id):
+        """Signed cookies can't be revoked. A deleted user's cookie stays valid
+        but no longer resolves to an account, so it grants nothing."""
+
+
+def get_session_interface(config):
+    """Create the session interface selected by SESSION_BACKEND"""
+    if config.get('SESSION_BACKEND', 'cookie') == 'cookie':
+        return CookieSessionInterface()
+    return ServerSessionInterface(get_session_backend(config), ttl=config.get('SESSION_TTL', 86400),
+                                  refresh_interval=config.get('SESSION_REFRESH', 300))
+
+
+def get_session_backend(config):
+    """Create the session backend selected by SESSION_BACKEND"""
+    backend = config.get('SESSION_BACKEND', 'sqlite')
+    if backend == 'memory':
+        return MemorySessionBackend(config.get('SESSION_MAX_ENTRIES', 10000))
+    if backend == 'sqlite':
+        return SQLiteSessionBackend(config.get('SESSION_DB', 'sessions.db'))
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
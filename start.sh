@@ -14,6 +14,19 @@ echo "Starting CyberStudy application on port $PORT"
 if [ "$FLASK_ENV" = "development" ]; then
     echo "Running in development mode with Flask dev server"
     python app.py
+elif [ "$SERVER" = "asgi" ]; then
+    # One event-loop worker per core; each runs the app on ASGI_THREADS threads
+    echo "Running in production mode with Gunicorn + Uvicorn workers (ASGI)"
+    exec gunicorn \
+        --bind 0.0.0.0:$PORT \
+        --worker-class uvicorn.workers.UvicornWorker \
+        --workers ${WEB_CONCURRENCY:-$(nproc)} \
+        --timeout 0 \
+        --keep-alive 2 \
+        --max-requests 1000 \
+        --max-requests-jitter 100 \
+        --preload \
+        asgi:application
 else
     echo "Running in production mode with Gunicorn"
     exec gunicorn \
@@ -25,5 +38,5 @@ else
         --max-requests 1000 \
         --max-requests-jitter 100 \
         --preload \
-        app:app
+        "app:create_app()"
 fi
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Static file serving with precompressed variants, conditional requests and ranges
+
+`flask compress-static` writes .br/.gz siblings next to compressible static
+files at build time. serve_static() picks the best sibling the client
+accepts, and hands the file to werkzeug's send_file, which answers
+If-None-Match / If-Modified-Since with 304, serves byte ranges, and passes
+the open file to the server's wsgi.file_wrapper (gunicorn uses sendfile()
+for it) instead of copying it through Python.
+"""
+
+import gzip
+import mimetypes
+import os
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.xml', '.json', '.ico', '.map')
+IMMUTABLE_PREFIX = 'dist/'
+ONE_YEAR = 31536000
+
+# (Accept-Encoding token, sibling suffix), best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _etag(stat, suffix=''):
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}{suffix}"
+
+
+def serve_static(directory, filename, mimetype=None):
+    """Serve a file from directory, preferring a precompressed sibling"""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    serve_path, encoding = path, None
+
+    # Byte ranges are only offered on the identity encoding
+    if request.range is None:
+        source_mtime = os.path.getmtime(path)
+        for token, suffix in ENCODINGS:
+            if request.accept_encodings[token] and os.path.isfile(path + suffix) \
+                    and os.path.getmtime(path + suffix) >= source_mtime:
+                serve_path, encoding = path + suffix, token
+                break
+
+    stat = os.stat(serve_path)
+    immutable = filename.startswith(IMMUTABLE_PREFIX)
+    response = send_file(serve_path, mimetype=mimetype, conditional=True,
+                         etag=_etag(stat, f'-{encoding}' if encoding else ''),
+                         last_modified=stat.st_mtime,
+                         max_age=ONE_YEAR if immutable else None)
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+def compress_static(static_folder, log=print):
+    """Write .gz (and .br, if brotli is installed) siblings for compressible files.
+
+    A sibling is only kept when it is smaller than the original, and existing
+    siblings newer than their source are left alone. Returns the number of
+    files written.
+    """
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            mtime = os.path.getmtime(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            compressors = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressors.append(('.br', lambda d: brotli.compress(d, quality=11)))
+
+            for suffix, compress in compressors:
+                sibling = path + suffix
+                if os.path.exists(sibling) and os.path.getmtime(sibling) >= mtime:
+                    continue
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                with open(sibling, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+                log(f"{os.path.relpath(sibling, static_folder)}: {len(data) // 1024} KB -> {len(compressed) // 1024} KB")
+    return written
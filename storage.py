@@ -0,0 +1,462 @@
+"""
+Storage backends for users and registrations
+
+Two interchangeable backends are provided:
+
+* JSONStorage keeps the original users.json file, and appends new
+  registrations to a JSON-Lines log next to the legacy registrations.json.
+* SQLiteStorage keeps normalized tables in a SQLite database in WAL mode,
+  so a single edit is a single-row transaction instead of a file rewrite.
+
+Both expose the same methods, so UserStore and the routes do not care which
+one is configured (see get_storage).
+
+Every user record carries a `version` that is bumped on each write.
+save_user/save_many only succeed if the stored version still matches the
+one the caller read, so two admins editing the same parent can't silently
+overwrite each other; edits to different records never conflict.
+"""
+
+import fcntl
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from registration_log import RegistrationLog, load_json_array, write_json_array
+
+
+class ConflictError(Exception):
+    """A user record was changed by someone else since it was read"""
+
+    def __init__(self, user_id):
+        super().__init__(f"User {user_id} was modified concurrently")
+        self.user_id = user_id
+
+
+def _check_versions(stored_versions, users):
+    """Raise ConflictError unless every user's version matches the stored one.
+
+    Returns the new version for each user, in order.
+    """
+    new_versions = []
+    for user in users:
+        expected = user.get('version', 0)
+        if stored_versions.get(user['id'], 0) != expected:
+            raise ConflictError(user['id'])
+        new_versions.append(expected + 1)
+    return new_versions
+
+
+def _file_signature(path):
+    """(inode, mtime, size) of a file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class JSONStorage:
+    """Users stored as a JSON array on disk, registrations in an append-only log"""
+
+    def __init__(self, users_path='users.json', registrations_path='registrations.json',
+                 registration_log=None):
+        self.users_path = users_path
+        self.registrations_path = registrations_path
+        self.registration_log = registration_log or RegistrationLog(f"{os.path.splitext(registrations_path)[0]}.jsonl")
+        self._lock = threading.Lock()
+        # Registration count so far: the legacy file it was taken against, its
+        # keys, and how far into the log (inode, byte offset) it has read
+        self._count_lock = threading.Lock()
+        self._count_state = None
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers across threads and across gunicorn worker processes"""
+        with self._lock, open(f"{self.users_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def signature(self):
+        """Return a value that changes whenever the users file changes"""
+        return _file_signature(self.users_path)
+
+    def check_writable(self):
+        """Raise OSError unless a file can be created next to the users file"""
+        directory = os.path.dirname(os.path.abspath(self.users_path))
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.writable-'):
+            pass
+
+    def load_users(self):
+        """Load all users"""
+        try:
+            with open(self.users_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def save_user(self, user):
+        """Insert or update one user, returning (signature before, signature after)"""
+        return self.save_many([user])
+
+    def save_many(self, changed):
+        """Insert or update several users with a single rewrite.
+
+        Returns the signature seen under the lock before writing and the new
+        one; if the first isn't the caller's, someone else wrote in between.
+        Raises ConflictError, writing nothing, if any of them is stale. On
+        success each user's version is bumped.
+        """
+        with self._locked():
+            previous = self.signature()
+            # Re-read under the lock so records changed by other workers are kept
+            users = self.load_users()
+            positions = {existing['id']: i for i, existing in enumerate(users)}
+            new_versions = _check_versions({u['id']: u.get('version', 0) for u in users}, changed)
+            for user, version in zip(changed, new_versions):
+                record = dict(user, version=version)
+                if user['id'] in positions:
+                    users[positions[user['id']]] = record
+                else:
+                    positions[user['id']] = len(users)
+                    users.append(record)
+            write_json_array(self.users_path, users)
+            signature = self.signature()
+        for user, version in zip(changed, new_versions):
+            user['version'] = version
+        return previous, signature
+
+    def delete_user(self, user_id):
+        """Delete one user, returning (signature before, signature after)"""
+        with self._locked():
+            previous = self.signature()
+            users = [user for user in self.load_users() if user['id'] != user_id]
+            write_json_array(self.users_path, users)
+            return previous, self.signature()
+
+    def load_registrations(self):
+        """Load all registrations: the legacy array followed by the log"""
+        registrations = load_json_array(self.registrations_path)
+        seen = {(r['id'], r['timestamp']) for r in registrations}
+        registrations.extend(r for r in self.registration_log.read() if (r['id'], r['timestamp']) not in seen)
+        return registrations
+
+    def registrations_signature(self):
+        """Return a value that changes whenever registrations are written or compacted"""
+        return (_file_signature(self.registrations_path), _file_signature(self.registration_log.path))
+
+    def count_registrations(self):
+        """Return the number of registrations, reading only what was appended since the last call.
+
+        The legacy file and the log are only read in full the first time and
+        after a compaction (the legacy file replaced or the log truncated).
+        """
+        with self._count_lock:
+            legacy = _file_signature(self.registrations_path)
+            log = _file_signature(self.registration_log.path)
+            inode = log[0] if log else None
+            state = self._count_state
+            if state is None or state['legacy'] != legacy or state['inode'] != inode or \
+                    (log is not None and log[2] < state['offset']):
+                registrations = load_json_array(self.registrations_path)
+                state = self._count_state = {
+                    'legacy': legacy,
+                    'keys': {(r['id'], r['timestamp']) for r in registrations},
+                    'inode': inode,
+                    'offset': 0,
+                    'count': len(registrations),
+                }
+            # Records already folded into the legacy file are counted there
+            records, state['offset'] = self.registration_log.read_from(state['offset'])
+            state['count'] += sum(1 for r in records if (r['id'], r['timestamp']) not in state['keys'])
+            return state['count']
+
+    def add_registration(self, registration):
+        """Queue one registration on the append-only log"""
+        return self.registration_log.append(registration)
+
+    def compact_registrations(self):
+        """Fold the registration log into the legacy registrations.json"""
+        return self.registration_log.compact(self.registrations_path)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+
+CREATE TABLE IF NOT EXISTS parents (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    parent_name TEXT NOT NULL,
+    role TEXT,
+    created_at TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_parents_email ON parents (email);
+
+CREATE TABLE IF NOT EXISTS students (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT NOT NULL REFERENCES parents (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL DEFAULT 0,
+    name TEXT NOT NULL,
+    age INTEGER,
+    grade TEXT,
+    level TEXT,
+    enrolled_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_students_parent ON students (parent_id, position);
+
+CREATE TABLE IF NOT EXISTS progress (
+    student_id TEXT PRIMARY KEY REFERENCES students (id) ON DELETE CASCADE,
+    current_level TEXT,
+    completed_projects INTEGER,
+    total_hours NUMERIC,
+    achievements INTEGER,
+    next_class_date TEXT,
+    notes TEXT,
+    last_updated TEXT
+);
+
+CREATE TABLE IF NOT EXISTS registrations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    parent_email TEXT,
+    child_name TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_registrations_id ON registrations (id);
+CREATE INDEX IF NOT EXISTS idx_registrations_email ON registrations (parent_email);
+
+-- Registration count, kept by _insert_registration (counted once for older databases)
+INSERT OR IGNORE INTO meta (key, value) SELECT 'registrations', COUNT(*) FROM registrations;
+"""
+
+PARENT_COLUMNS = ('id', 'email', 'password_hash', 'salt', 'parent_name', 'role', 'created_at', 'version')
+STUDENT_COLUMNS = ('id', 'name', 'age', 'grade', 'level', 'enrolled_date')
+PROGRESS_COLUMNS = ('current_level', 'completed_projects', 'total_hours', 'achievements',
+                    'next_class_date', 'notes', 'last_updated')
+
+
+class SQLiteStorage:
+    """Users, students, progress and registrations in a SQLite database"""
+
+    def __init__(self, path='cyberstudy.db'):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        # Databases created before record versions existed
+        if 'version' not in [row['name'] for row in conn.execute('PRAGMA table_info(parents)')]:
+            conn.execute('ALTER TABLE parents ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn, *args):
+        """Run fn(conn, *args) in a write transaction and bump the revision.
+
+        Returns the revision before and after the write.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            previous = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+            fn(conn, *args)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+            revision = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return previous, revision
+
+    def check_writable(self):
+        """Raise sqlite3.Error unless the write lock can be taken within a second"""
+        conn = self._connection()
+        conn.execute('PRAGMA busy_timeout = 1000')
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('ROLLBACK')
+        finally:
+            conn.execute('PRAGMA busy_timeout = 30000')
+
+    def signature(self):
+        """Return the revision counter, bumped by every write"""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return row[0]
+
+    def load_users(self):
+        """Load all users, with their students and progress"""
+        conn = self._connection()
+        users = []
+        by_id = {}
+        for row in conn.execute('SELECT * FROM parents ORDER BY rowid'):
+            user = {column: row[column] for column in PARENT_COLUMNS if row[column] is not None}
+            user['students'] = []
+            users.append(user)
+            by_id[user['id']] = user
+
+        query = ('SELECT s.*, p.student_id AS has_progress, '
+                 + ', '.join(f'p.{column} AS p_{column}' for column in PROGRESS_COLUMNS)
+                 + ' FROM students s LEFT JOIN progress p ON p.student_id = s.id'
+                 + ' ORDER BY s.parent_id, s.position')
+        for row in conn.execute(query):
+            student = {column: row[column] for column in STUDENT_COLUMNS}
+            if row['has_progress'] is not None:
+                student['progress'] = {column: row[f'p_{column}'] for column in PROGRESS_COLUMNS}
+            parent = by_id.get(row['parent_id'])
+            if parent is not None:
+                parent['students'].append(student)
+        return users
+
+    def _upsert_user(self, conn, user):
+        # An upsert rather than INSERT OR REPLACE, which would delete the
+        # parent row and cascade to its students
+        conn.execute(
+            f"INSERT INTO parents ({', '.join(PARENT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(PARENT_COLUMNS))}) "
+            f"ON CONFLICT (id) DO UPDATE SET "
+            + ', '.join(f'{column} = excluded.{column}' for column in PARENT_COLUMNS[1:]),
+            [user.get(column, 0 if column == 'version' else None) for column in PARENT_COLUMNS])
+
+        students = user.get('students', [])
+        student_ids = [student['id'] for student in students]
+        conn.execute(
+            f"DELETE FROM students WHERE parent_id = ? AND id NOT IN ({', '.join('?' * len(student_ids))})",
+            [user['id']] + student_ids)
+
+        for position, student in enumerate(students):
+            conn.execute(
+                'INSERT INTO students (id, parent_id, position, name, age, grade, level, enrolled_date) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET parent_id = excluded.parent_id, position = excluded.position, '
+                'name = excluded.name, age = excluded.age, grade = excluded.grade, level = excluded.level, '
+                'enrolled_date = excluded.enrolled_date',
+                [student['id'], user['id'], position] + [student.get(column) for column in STUDENT_COLUMNS[1:]])
+
+            progress = student.get('progress')
+            if progress is not None:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO progress (student_id, {', '.join(PROGRESS_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(PROGRESS_COLUMNS))})",
+                    [student['id']] + [progress.get(column) for column in PROGRESS_COLUMNS])
+
+    def save_user(self, user):
+        """Insert or update one user in one transaction, returning (revision before, revision after)"""
+        return self.save_many([user])
+
+    def save_many(self, users):
+        """Insert or update several users in one transaction, returning (revision before, revision after).
+
+        Raises ConflictError, writing nothing, if any of them is stale. On
+        success each user's version is bumped.
+        """
+        new_versions = []
+
+        def upsert(conn):
+            ids = [user['id'] for user in users]
+            rows = conn.execute(f"SELECT id, version FROM parents WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            new_versions[:] = _check_versions({row['id']: row['version'] for row in rows}, users)
+            for user, version in zip(users, new_versions):
+                self._upsert_user(conn, dict(user, version=version))
+
+        revisions = self._write(upsert)
+        for user, version in zip(users, new_versions):
+            user['version'] = version
+        return revisions
+
+    def delete_user(self, user_id):
+        """Delete one user (students and progress cascade), returning (revision before, revision after)"""
+        return self._write(lambda conn: conn.execute('DELETE FROM parents WHERE id = ?', (user_id,)))
+
+    def load_registrations(self):
+        """Load all registrations in submission order"""
+        rows = self._connection().execute('SELECT data FROM registrations ORDER BY seq')
+        return [json.loads(row['data']) for row in rows]
+
+    def registrations_signature(self):
+        """Return the registration count, which every insert bumps"""
+        return self.count_registrations()
+
+    def count_registrations(self):
+        """Return the number of registrations from the counter in meta"""
+        return self._connection().execute("SELECT value FROM meta WHERE key = 'registrations'").fetchone()[0]
+
+    def _insert_registration(self, conn, registration):
+        conn.execute(
+            'INSERT INTO registrations (id, timestamp, parent_email, child_name, status, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (registration['id'], registration['timestamp'],
+             registration.get('parent_info', {}).get('email'),
+             registration.get('child_info', {}).get('name'),
+             registration.get('status'), json.dumps(registration)))
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'registrations'")
+
+    def add_registration(self, registration):
+        """Insert one registration"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._insert_registration(conn, registration)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return registration['id']
+
+
+def migrate_json_to_sqlite(source, target):
+    """Copy users and registrations from a JSONStorage into a SQLiteStorage.
+
+    Users are upserted, so running it twice is harmless. Registrations are
+    only copied into an empty registrations table.
+    """
+    users = source.load_users()
+    registrations = source.load_registrations()
+
+    def copy(conn):
+        for user in users:
+            target._upsert_user(conn, user)
+        if conn.execute('SELECT COUNT(*) FROM registrations').fetchone()[0] == 0:
+            for registration in registrations:
+                target._insert_registration(conn, registration)
+
+    target._write(copy)
+    return len(users), len(registrations)
+
+
+def get_storage(config):
+    """Create the storage backend selected by STORAGE_BACKEND"""
+    backend = config.get('STORAGE_BACKEND', 'json')
+    if backend == 'sqlite':
+        return SQLiteStorage(config.get('SQLITE_PATH', 'cyberstudy.db'))
+    if backend == 'json':
+        registration_log = RegistrationLog(config.get('REGISTRATION_LOG', 'registrations.jsonl'),
+                                           batch_size=config.get('REGISTRATION_BATCH_SIZE', 100),
+                                           flush_interval=config.get('REGISTRATION_FLUSH_MS', 50) / 1000)
+        return JSONStorage(config.get('USERS_FILE', 'users.json'),
+                           config.get('REGISTRATIONS_FILE', 'registrations.json'),
+                           registration_log)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -7,7 +7,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_demo_user, load_users, verify_password, hash_password
+from app import create_demo_user, hash_password, password_hasher, user_store
 
 def test_demo_user_creation():
     """Test if demo user is created correctly"""
@@ -17,7 +17,7 @@ def test_demo_user_creation():
     create_demo_user()
     
     # Load users and check if demo user exists
-    users = load_users()
+    users = user_store.all()
     print(f"Total users in database: {len(users)}")
     
     demo_user = None
@@ -34,7 +34,7 @@ def test_demo_user_creation():
         
         # Test password verification
         test_password = 'demo123'
-        if verify_password(test_password, demo_user['password_hash'], demo_user['salt']):
+        if password_hasher.verify(test_password, demo_user['password_hash'], demo_user['salt']):
             print("✅ Password verification works correctly")
         else:
             print("❌ Password verification failed")
@@ -57,7 +57,7 @@ def test_password_hashing():
     print(f"   Generated salt: {salt[:20]}...")
     
     # Test verification
-    if verify_password(test_password, password_hash, salt):
+    if password_hasher.verify(test_password, password_hash, salt):
         print("✅ Password hashing and verification works correctly")
         return True
     else:
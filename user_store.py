@@ -0,0 +1,236 @@
+"""
+In-memory user store with hash indexes over the configured storage backend
+"""
+
+import threading
+
+
+def copy_user(user):
+    """Return a copy of a user that can be edited and saved.
+
+    The store's own dicts are shared by every request thread, so edits go to
+    a copy; the copy keeps the version it was read at, which save_user checks.
+    """
+    students = []
+    for student in user.get('students', []):
+        student = dict(student)
+        if 'progress' in student:
+            student['progress'] = dict(student['progress'])
+        students.append(student)
+    return dict(user, students=students)
+
+
+class UserStore:
+    """Holds users in memory, indexed by email, id and student id.
+
+    Users are only re-read from storage when its signature (file inode/mtime
+    for JSON, revision counter for SQLite) changes, so lookups cost a cheap
+    check instead of a full parse and list scan.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.RLock()
+        self._signature = None
+        self._loaded = False
+        self._users = []
+        self._by_email = {}
+        self._by_id = {}
+        self._by_student = {}
+        self._keys = {}
+        # Bumped on every full reload and per user on every write, so derived
+        # data (e.g. dashboards) can be cached against version(user_id)
+        self._generation = 0
+        self._versions = {}
+        self._writes = 0
+        self._listeners = []
+
+    def _index_user(self, user, by_email=None, by_id=None, by_student=None, keys=None):
+        """Add one user to the lookup tables (the live ones by default)"""
+        by_email = self._by_email if by_email is None else by_email
+        by_id = self._by_id if by_id is None else by_id
+        by_student = self._by_student if by_student is None else by_student
+        keys = self._keys if keys is None else keys
+
+        by_email[user['email']] = user
+        by_id[user['id']] = user
+        for student in user.get('students', []):
+            by_student[student['id']] = (user, student)
+        keys[user['id']] = (user['email'], [student['id'] for student in user.get('students', [])])
+
+    def _unindex_user(self, user_id):
+        """Remove one user from the lookup tables"""
+        email, student_ids = self._keys.pop(user_id, (None, []))
+        if self._by_email.get(email, {}).get('id') == user_id:
+            del self._by_email[email]
+        self._by_id.pop(user_id, None)
+        for student_id in student_ids:
+            self._by_student.pop(student_id, None)
+
+    def _index(self, users, signature):
+        """Rebuild the lookup tables for a list of users"""
+        # Build into fresh dicts and swap them in, so concurrent readers never
+        # see a half-built index
+        by_email, by_id, by_student, keys = {}, {}, {}, {}
+        for user in users:
+            self._index_user(user, by_email, by_id, by_student, keys)
+        self._by_email, self._by_id, self._by_student, self._keys = by_email, by_id, by_student, keys
+        self._users = users
+        self._signature = signature
+        self._loaded = True
+        self._generation += 1
+        self._notify('reload', users)
+
+    def subscribe(self, listener):
+        """Register listener(event, payload), called after every change.
+
+        Events are ('reload', users) after a full (re)load, ('save', user)
+        and ('delete', user_id). Listeners run under the store lock and
+        should be quick.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event, payload):
+        for listener in self._listeners:
+            listener(event, payload)
+
+    def _refresh(self):
+        """Reload from storage if it changed since it was last read"""
+        if self._loaded and self.storage.signature() == self._signature:
+            return
+
+        with self._lock:
+            signature = self.storage.signature()
+            if self._loaded and signature == self._signature:
+                return
+            self._index(self.storage.load_users(), signature)
+
+    @property
+    def loaded(self):
+        """Whether users have been read from storage at least once"""
+        return self._loaded
+
+    def revision(self):
+        """Return a token that changes whenever any user may have changed"""
+        self._refresh()
+        return (self._generation, self._writes)
+
+    def signature(self):
+        """Return the storage signature of the loaded users.
+
+        Unlike revision(), it means the same in every process, so it can be
+        handed to clients (e.g. in ETags) that may come back to another worker.
+        """
+        self._refresh()
+        return self._signature
+
+    def version(self, user_id):
+        """Return a token that changes whenever the given user may have changed"""
+        self._refresh()
+        return (self._generation, self._versions.get(user_id, 0))
+
+    def all(self):
+        """Return a list of all users"""
+        self._refresh()
+        return list(self._users)
+
+    def get_by_email(self, email):
+        """Return the user with the given email, or None"""
+        self._refresh()
+        return self._by_email.get(email)
+
+    def get_by_id(self, user_id):
+        """Return the user with the given id, or None"""
+        self._refresh()
+        return self._by_id.get(user_id)
+
+    def find_student(self, student_id):
+        """Return (parent, student) for a student id, or (None, None)"""
+        self._refresh()
+        return self._by_student.get(student_id, (None, None))
+
+    def save_user(self, user):
+        """Insert or update a single user"""
+        self.save_many([user])
+
+    def _written(self, previous, signature):
+        """Record the storage signature after our own write.
+
+        If storage had changed since we last read it (another process wrote
+        in between), our copy lacks that write, so it is read again on the
+        next access instead of claiming to be current.
+        """
+        self._signature = signature if previous == self._signature else None
+
+    def save_many(self, users):
+        """Insert or update several users with one storage write.
+
+        Nothing in memory changes unless the write succeeds.
+        """
+        with self._lock:
+            self._refresh()
+            previous, signature = self.storage.save_many(users)
+            replaced = {}
+            for user in users:
+                existing = self._by_id.get(user['id'])
+                if existing is None:
+                    self._users.append(user)
+                elif existing is not user:
+                    replaced[id(existing)] = user
+                self._unindex_user(user['id'])
+                self._index_user(user)
+                self._versions[user['id']] = self._versions.get(user['id'], 0) + 1
+            if replaced:
+                self._users = [replaced.get(id(u), u) for u in self._users]
+            self._writes += 1
+            self._written(previous, signature)
+            for user in users:
+                self._notify('save', user)
+
+    def delete_user(self, user_id):
+        """Delete a single user"""
+        with self._lock:
+            self._refresh()
+            previous, signature = self.storage.delete_user(user_id)
+            if user_id in self._by_id:
+                self._users = [u for u in self._users if u['id'] != user_id]
+                self._unindex_user(user_id)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._writes += 1
+            self._written(previous, signature)
+            self._notify('delete', user_id)
+
+
+class RoleCache:
+    """user id -> role, kept current from the user store's change events.
+
+    Filled at sign-in (and on first lookup after a restart); a save updates
+    the entry, a delete drops it and a full reload from storage clears it.
+    """
+
+    def __init__(self, user_store):
+        self.user_store = user_store
+        self._roles = {}
+        user_store.subscribe(self._on_change)
+
+    def _on_change(self, event, payload):
+        if event == 'reload':
+            self._roles = {}
+        elif event == 'save':
+            self._roles[payload['id']] = payload.get('role')
+        elif event == 'delete':
+            self._roles.pop(payload, None)
+
+    def remember(self, user):
+        self._roles[user['id']] = user.get('role')
+
+    def role(self, user_id):
+        """Return a user's role (None for parents and unknown users)"""
+        try:
+            return self._roles[user_id]
+        except KeyError:
+            user = self.user_store.get_by_id(user_id)
+            if user is None:
+                return None
+            self._roles[user_id] = user.get('role')
+            return self._roles[user_id]